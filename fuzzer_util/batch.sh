@@ -12,10 +12,13 @@ rm input.txt
 echo "Compiling C version..."
 clang -O0 -c test/c_code/coverage/coverage_cb.c -o test/c_code/coverage/coverage_cb.o
 clang -O0 -fsanitize=address -fsanitize-coverage=no-prune,trace-pc-guard -c test/c_code/"${PROGRAM_NAME}".c -o test/c_code/temp.o
-clang -O0 -fsanitize=address test/c_code/coverage/coverage_cb.o test/c_code/temp.o -o test/c_code/compiled/"${PROGRAM_NAME}"
+clang -O0 -fsanitize=address test/c_code/coverage/coverage_cb.o test/c_code/temp.o -lrt -o test/c_code/compiled/"${PROGRAM_NAME}"
 rm test/c_code/temp.o
 rm test/c_code/coverage/coverage_cb.o
 
+echo "Compiling forkserver shim..."
+clang -O2 -shared -fPIC test/c_code/coverage/forkserver.c -o test/c_code/compiled/forkserver.so -ldl
+
 echo "Compiling Rust version..."
 rustc test/rust_code/"${PROGRAM_NAME}"_safe.rs -o test/rust_code/compiled/"${PROGRAM_NAME}"_safe_rs
 
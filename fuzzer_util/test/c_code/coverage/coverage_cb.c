@@ -2,35 +2,80 @@
 #include <stdint.h>
 #include <stdlib.h>
 #include <stdbool.h>
+#include <fcntl.h>
+#include <unistd.h>
 #include <sys/file.h>
+#include <sys/mman.h>
+
+/*
+ * Shared-memory coverage map, must match src/diff_oracle/coverage.py
+ * header: uint32 magic, uint32 number of guards, then one byte per guard
+ */
+#define MAP_SIZE (1 << 16)
+#define SHM_MAGIC 0xC2A5C0DE
+
+struct cov_header {
+    uint32_t magic;
+    uint32_t total_guards;
+};
 
 static uint32_t total_guards = 0;
 static bool *guards_hit = NULL;
+static uint8_t *shm_map = NULL;
+
+__attribute__((no_sanitize("coverage")))
+static uint8_t *attach_shm(void) {
+    const char *name = getenv("C2RUST_SHM_NAME");
+    if (!name)
+        return NULL;
+    int fd = shm_open(name, O_RDWR, 0);
+    if (fd < 0)
+        return NULL;
+    void *p = mmap(NULL, sizeof(struct cov_header) + MAP_SIZE, PROT_READ | PROT_WRITE, MAP_SHARED, fd, 0);
+    close(fd);
+    if (p == MAP_FAILED)
+        return NULL;
+    return (uint8_t *)p;
+}
+
 __attribute__((no_sanitize("coverage")))
 void __sanitizer_cov_trace_pc_guard_init(uint32_t *start, uint32_t *stop) {
     if (start == stop || *start)
         return;
 
     total_guards = stop - start;
+    uint32_t counter = 1;
+    for (uint32_t *x = start; x < stop; x++) {
+        *x = counter++;
+    }
+    shm_map = attach_shm();
+    if (shm_map) {
+        // hits go straight to the shared map, python reads it after the run
+        struct cov_header *header = (struct cov_header *)shm_map;
+        header->magic = SHM_MAGIC;
+        header->total_guards = total_guards;
+        return;
+    }
+    // no shared map: standalone run, report the percentage through a file at exit
     guards_hit = (bool*)calloc(total_guards, sizeof(bool));
     if (!guards_hit) {
         fprintf(stderr, "Error: Failed to allocate memory for coverage tracking.\n");
         exit(1);
     }
-    uint32_t counter = 1;
-    for (uint32_t *x = start; x < stop; x++) {
-        *x = counter++;
-    }
     // printf("INIT: coverage tracking enabled for %u edges\n", total_guards);
 }
 
 __attribute__((no_sanitize("coverage")))
 void __sanitizer_cov_trace_pc_guard(uint32_t *guard) {
-    if (!guard || !*guard || !guards_hit)
+    if (!guard || !*guard)
         return;
 
     uint32_t index = *guard - 1;
-    if (index < total_guards) {
+    if (shm_map) {
+        shm_map[sizeof(struct cov_header) + (index & (MAP_SIZE - 1))] = 1;
+        return;
+    }
+    if (guards_hit && index < total_guards) {
         guards_hit[index] = true;
     }
 }
@@ -48,7 +93,12 @@ static void print_coverage() {
     }
     double percentage = 100.0 * hit / total_guards;
 
-    FILE *fp = fopen("/tmp/c2rust_cov.txt", "w");
+    const char *path = getenv("C2RUST_COV_FILE");
+    if (!path)
+        path = "/tmp/c2rust_cov.txt";
+    FILE *fp = fopen(path, "w");
+    if (!fp)
+        return;
     int fd = fileno(fp);
 
     flock(fd, LOCK_EX);
@@ -56,7 +106,7 @@ static void print_coverage() {
     fflush(fp);
     flock(fd, LOCK_UN);
     fclose(fp);
-    
+
     free(guards_hit);
     guards_hit = NULL;
 }
@@ -0,0 +1,104 @@
+#define _GNU_SOURCE
+#include <dlfcn.h>
+#include <fcntl.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+#include <sys/types.h>
+#include <sys/wait.h>
+
+/*
+ * AFL-style forkserver shim, loaded through LD_PRELOAD so it works for both the
+ * C binary and the Rust binary without recompiling them.
+ * The constructor runs after the dynamic linker and sanitizer runtimes are
+ * initialized, then parks the process in a loop: every 4-byte message on the
+ * control pipe forks one child which returns from here and runs main().
+ * Args input: the child's __libc_start_main (hooked below) appends the arguments
+ * of the current input, read from the file named by C2RUST_FORKSRV_ARGS, to the
+ * argv the forkserver was started with, so main() and Rust's std::env::args()
+ * see them as real arguments.
+ */
+#define FORKSRV_FD 198
+// largest argument file read
+#define MAX_ARGS_LEN (1 << 20)
+
+typedef int (*main_fn)(int, char **, char **);
+typedef int (*libc_start_main_fn)(main_fn, int, char **, void (*)(void), void (*)(void), void (*)(void), void *);
+
+// argv of the input: argv of the forkserver followed by the '\0'-terminated tokens of the args file
+static char **c2rust_input_argv(int *argc, char **argv) {
+    const char *path = getenv("C2RUST_FORKSRV_ARGS");
+    if (!path)
+        return argv;
+    int fd = open(path, O_RDONLY);
+    if (fd < 0)
+        return argv;
+    char *buf = malloc(MAX_ARGS_LEN + 1);
+    ssize_t len = 0, n;
+    while (buf && len < MAX_ARGS_LEN && (n = read(fd, buf + len, MAX_ARGS_LEN - len)) > 0)
+        len += n;
+    close(fd);
+    if (!buf || len <= 0)
+        return argv;
+    buf[len] = '\0';
+
+    int tokens = 0;
+    for (ssize_t i = 0; i < len; i++)
+        tokens += buf[i] == '\0';
+    if (buf[len - 1] != '\0')
+        tokens++;
+    char **ret = malloc(sizeof(char *) * (*argc + tokens + 1));
+    if (!ret)
+        return argv;
+    int rc = 0;
+    for (; rc < *argc; rc++)
+        ret[rc] = argv[rc];
+    for (char *p = buf; p < buf + len; p += strlen(p) + 1)
+        ret[rc++] = p;
+    ret[rc] = NULL;
+    *argc = rc;
+    return ret;
+}
+
+int __libc_start_main(main_fn main, int argc, char **argv, void (*init)(void), void (*fini)(void),
+                      void (*rtld_fini)(void), void *stack_end) {
+    libc_start_main_fn real = (libc_start_main_fn)dlsym(RTLD_NEXT, "__libc_start_main");
+    if (getenv("C2RUST_FORKSRV"))
+        argv = c2rust_input_argv(&argc, argv);
+    return real(main, argc, argv, init, fini, rtld_fini, stack_end);
+}
+
+__attribute__((constructor))
+static void c2rust_forkserver(void) {
+    // only act when launched by ForkserverHandler
+    if (!getenv("C2RUST_FORKSRV"))
+        return;
+
+    uint32_t msg = 0;
+    // say hello, if nobody is listening just run the program normally
+    if (write(FORKSRV_FD + 1, &msg, 4) != 4)
+        return;
+
+    while (1) {
+        if (read(FORKSRV_FD, &msg, 4) != 4)
+            _exit(0);
+
+        pid_t pid = fork();
+        if (pid < 0)
+            _exit(1);
+        if (pid == 0) {
+            close(FORKSRV_FD);
+            close(FORKSRV_FD + 1);
+            return;
+        }
+        if (write(FORKSRV_FD + 1, &pid, 4) != 4)
+            _exit(1);
+
+        int status = 0;
+        if (waitpid(pid, &status, 0) < 0)
+            _exit(1);
+        if (write(FORKSRV_FD + 1, &status, 4) != 4)
+            _exit(1);
+    }
+}
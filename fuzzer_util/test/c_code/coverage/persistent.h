@@ -0,0 +1,128 @@
+#ifndef C2RUST_PERSISTENT_H
+#define C2RUST_PERSISTENT_H
+
+/*
+ * Persistent-mode harness for stdin driven programs, used with PersistentHandler
+ * (src/diff_oracle/persistent.py). One process consumes many inputs in a loop.
+ *
+ * request  (stdin):  uint32 len | payload
+ * response (stdout): int32 exit_code | uint32 out_len | out | uint32 err_len | err
+ *
+ * Usage: rename main() to e.g. target_main() and add
+ *     PERSISTENT_MAIN(target_main)
+ * During each iteration stdin reads the payload, stdout/stderr are captured and sent back.
+ * exit() inside the target still reports its status before the process ends, crashes are
+ * detected by the handler which respawns the process.
+ * The target must not depend on global state left over from a previous iteration.
+ * Without C2RUST_PERSISTENT in the environment the program runs once as usual.
+ */
+#define _GNU_SOURCE
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <fcntl.h>
+#include <unistd.h>
+#include <getopt.h>
+
+static int persistent_fd = -1;
+static int persistent_active = 0;
+static char *persistent_out = NULL, *persistent_err = NULL;
+static size_t persistent_out_len = 0, persistent_err_len = 0;
+
+static inline int persistent_read_all(int fd, void *buf, size_t n) {
+    char *p = (char *)buf;
+    while (n) {
+        ssize_t r = read(fd, p, n);
+        if (r <= 0)
+            return -1;
+        p += r;
+        n -= r;
+    }
+    return 0;
+}
+
+static inline void persistent_write_all(int fd, const void *buf, size_t n) {
+    const char *p = (const char *)buf;
+    while (n) {
+        ssize_t w = write(fd, p, n);
+        if (w <= 0)
+            _exit(1);
+        p += w;
+        n -= w;
+    }
+}
+
+static inline void persistent_send(int32_t exit_code) {
+    fflush(stdout);
+    fflush(stderr);
+    uint32_t out_len = (uint32_t)persistent_out_len, err_len = (uint32_t)persistent_err_len;
+    persistent_write_all(persistent_fd, &exit_code, 4);
+    persistent_write_all(persistent_fd, &out_len, 4);
+    persistent_write_all(persistent_fd, persistent_out, out_len);
+    persistent_write_all(persistent_fd, &err_len, 4);
+    persistent_write_all(persistent_fd, persistent_err, err_len);
+}
+
+static void persistent_on_exit(int status, void *arg) {
+    (void)arg;
+    // exit() called by the target: answer the pending input before dying
+    if (persistent_active) {
+        persistent_active = 0;
+        persistent_send(status);
+    }
+}
+
+static inline int persistent_loop(int (*body)(int, char **), int argc, char **argv) {
+    if (!getenv("C2RUST_PERSISTENT"))
+        return body(argc, argv);
+
+    // keep the real stdout for responses, stray writes to fd 1 must not break the framing
+    persistent_fd = dup(STDOUT_FILENO);
+    int devnull = open("/dev/null", O_WRONLY);
+    if (persistent_fd < 0 || devnull < 0)
+        return 1;
+    dup2(devnull, STDOUT_FILENO);
+    close(devnull);
+    on_exit(persistent_on_exit, NULL);
+
+    FILE *real_stdin = stdin, *real_stdout = stdout, *real_stderr = stderr;
+    char *buf = NULL;
+    uint32_t len = 0;
+    while (persistent_read_all(STDIN_FILENO, &len, 4) == 0) {
+        buf = (char *)realloc(buf, len + 1);
+        if (!buf || persistent_read_all(STDIN_FILENO, buf, len) != 0)
+            break;
+        buf[len] = '\0';
+
+        stdin = len ? fmemopen(buf, len, "r") : fopen("/dev/null", "r");
+        stdout = open_memstream(&persistent_out, &persistent_out_len);
+        stderr = open_memstream(&persistent_err, &persistent_err_len);
+        optind = 1;
+
+        persistent_active = 1;
+        int code = body(argc, argv);
+        persistent_active = 0;
+        persistent_send(code);
+
+        fclose(stdin);
+        fclose(stdout);
+        fclose(stderr);
+        free(persistent_out);
+        free(persistent_err);
+        persistent_out = persistent_err = NULL;
+        persistent_out_len = persistent_err_len = 0;
+        stdin = real_stdin;
+        stdout = real_stdout;
+        stderr = real_stderr;
+    }
+    free(buf);
+    return 0;
+}
+
+#define PERSISTENT_MAIN(body)                      \
+int main(int argc, char **argv) {                  \
+    return persistent_loop((body), argc, argv);    \
+}
+
+#endif // C2RUST_PERSISTENT_H
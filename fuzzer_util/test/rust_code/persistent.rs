@@ -0,0 +1,89 @@
+// Persistent-mode shim for stdin driven Rust programs, counterpart of
+// test/c_code/coverage/persistent.h, used with PersistentHandler.
+//
+// request  (stdin):  u32 len | payload
+// response (stdout): i32 exit_code | u32 out_len | out | u32 err_len | err
+//
+// Usage: add `mod persistent;` next to main.rs and move the program body into a closure
+// writing to `out` / `err` instead of println!/eprintln!:
+//
+//     fn main() {
+//         persistent::run(|input, out, err| {
+//             ...
+//             writeln!(out, "{}", result).unwrap();
+//             0
+//         });
+//     }
+//
+// A panic is reported as exit code 101 with the panic message on stderr, like a normal
+// Rust process. Without C2RUST_PERSISTENT in the environment the body runs once on the
+// real stdin/stdout.
+#![allow(dead_code)]
+
+use std::io::{self, Read, Write};
+use std::panic::{self, AssertUnwindSafe};
+
+const PANIC_EXIT_CODE: i32 = 101;
+
+fn read_frame(input: &mut impl Read) -> Option<Vec<u8>> {
+    let mut len = [0u8; 4];
+    input.read_exact(&mut len).ok()?;
+    let mut payload = vec![0u8; u32::from_le_bytes(len) as usize];
+    input.read_exact(&mut payload).ok()?;
+    Some(payload)
+}
+
+fn write_response(output: &mut impl Write, code: i32, out: &[u8], err: &[u8]) -> io::Result<()> {
+    output.write_all(&code.to_le_bytes())?;
+    output.write_all(&(out.len() as u32).to_le_bytes())?;
+    output.write_all(out)?;
+    output.write_all(&(err.len() as u32).to_le_bytes())?;
+    output.write_all(err)?;
+    output.flush()
+}
+
+fn run_once<F>(body: &mut F, input: &[u8], out: &mut Vec<u8>, err: &mut Vec<u8>) -> i32
+where
+    F: FnMut(&[u8], &mut Vec<u8>, &mut Vec<u8>) -> i32,
+{
+    match panic::catch_unwind(AssertUnwindSafe(|| body(input, &mut *out, &mut *err))) {
+        Ok(code) => code,
+        Err(payload) => {
+            let msg = payload
+                .downcast_ref::<&str>()
+                .map(|s| s.to_string())
+                .or_else(|| payload.downcast_ref::<String>().cloned())
+                .unwrap_or_default();
+            err.extend_from_slice(format!("thread 'main' panicked: {}\n", msg).as_bytes());
+            PANIC_EXIT_CODE
+        }
+    }
+}
+
+pub fn run<F>(mut body: F)
+where
+    F: FnMut(&[u8], &mut Vec<u8>, &mut Vec<u8>) -> i32,
+{
+    if std::env::var_os("C2RUST_PERSISTENT").is_none() {
+        let mut input = Vec::new();
+        io::stdin().read_to_end(&mut input).unwrap_or_default();
+        let (mut out, mut err) = (Vec::new(), Vec::new());
+        let code = run_once(&mut body, &input, &mut out, &mut err);
+        io::stdout().write_all(&out).ok();
+        io::stderr().write_all(&err).ok();
+        std::process::exit(code);
+    }
+    // the panic message is already captured in err
+    panic::set_hook(Box::new(|_| {}));
+    let stdin = io::stdin();
+    let stdout = io::stdout();
+    let mut input = stdin.lock();
+    let mut output = stdout.lock();
+    while let Some(payload) = read_frame(&mut input) {
+        let (mut out, mut err) = (Vec::new(), Vec::new());
+        let code = run_once(&mut body, &payload, &mut out, &mut err);
+        if write_response(&mut output, code, &out, &err).is_err() {
+            break;
+        }
+    }
+}
@@ -0,0 +1,86 @@
+import sys
+import time
+import argparse
+import warnings
+import tracemalloc
+import cma
+import numpy as np
+from deap import creator
+from deap.cma import StrategyMultiObjective
+import src.algo.mo_cma as mo_cma
+import src.algo.sep_cma as sep_cma
+
+"""
+Memory and update time of the CMA strategies vs the dimension.
+Runs a few generations of each strategy on random fitness values and prints the peak memory
+allocated (tracemalloc) and the mean time of one generate + update (ask + tell for pycma).
+python -m src.algo.bench_cma [--dims 10 100 1000 4096] [--full-max 1000]
+"""
+
+def _population(n: int, dim: int) -> list:
+    pop = [creator.Individual(np.random.uniform(0, 255, dim).tolist()) for _ in range(n)]
+    for ind in pop:
+        ind.fitness.values = tuple(np.random.rand(2))
+    return pop
+
+def bench_deap(strategy_class, dim: int, mu: int, lambda_: int, gens: int) -> (float, float):
+    """
+    :return: peak MB, ms per generation
+    """
+    tracemalloc.start()
+    strategy = strategy_class(_population(mu, dim), sigma=10.0, lambda_=lambda_, mu=mu)
+    start = time.perf_counter()
+    for _ in range(gens):
+        offspring = strategy.generate(creator.Individual)
+        for ind in offspring:
+            ind.fitness.values = tuple(np.random.rand(2))
+        strategy.update(offspring)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 2 ** 20, elapsed / gens * 1000
+
+def bench_pycma(diagonal: bool, dim: int, popsize: int, gens: int) -> (float, float):
+    tracemalloc.start()
+    opts = {'popsize': popsize, 'CMA_diagonal': diagonal, 'verbose': -9, 'verb_log': 0}
+    es = cma.CMAEvolutionStrategy(np.random.uniform(0, 255, dim), 10.0, opts)
+    start = time.perf_counter()
+    for _ in range(gens):
+        solutions = es.ask()
+        es.tell(solutions, list(np.random.rand(len(solutions))))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 2 ** 20, elapsed / gens * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark full vs separable CMA strategies")
+    parser.add_argument('--dims', type=int, nargs='+', default=[10, 100, 500, 1000, 4096])
+    parser.add_argument('--mu', type=int, default=20, help="parents of the MO-CMA-ES strategies")
+    parser.add_argument('--lambda', type=int, default=40, dest='lambda_', help="offspring / pycma popsize")
+    parser.add_argument('--gens', type=int, default=5)
+    parser.add_argument('--full-max', type=int, default=1000, metavar='dim',
+                        help="largest dimension the full-covariance strategies are run with")
+    args = parser.parse_args()
+
+    warnings.simplefilter('ignore')
+    mo_cma._create_types()
+    engines = [
+        ('MO full', True, lambda dim: bench_deap(StrategyMultiObjective, dim, args.mu, args.lambda_, args.gens)),
+        ('MO sep', False,
+         lambda dim: bench_deap(sep_cma.SepStrategyMultiObjective, dim, args.mu, args.lambda_, args.gens)),
+        ('pycma full', True, lambda dim: bench_pycma(False, dim, args.lambda_, args.gens)),
+        ('pycma sep', False, lambda dim: bench_pycma(True, dim, args.lambda_, args.gens)),
+    ]
+    print("{:<12}{:>8}{:>12}{:>14}".format("strategy", "dim", "peak MB", "ms / gen"))
+    for name, full, bench in engines:
+        for dim in args.dims:
+            if full and dim > args.full_max:
+                print("{:<12}{:>8}{:>12}{:>14}".format(name, dim, "-", "skipped"))
+                continue
+            peak, ms = bench(dim)
+            print("{:<12}{:>8}{:>12.1f}{:>14.2f}".format(name, dim, peak, ms))
+        sys.stdout.flush()
+
+if __name__ == '__main__':
+    main()
@@ -2,22 +2,64 @@ import numpy as np
 import cma
 import math
 import random
+import warnings
 import src.utils.config as config
+import src.algo.evaluator as evaluator
+import src.algo.dedup as dedup
+import src.algo.sep_cma as sep_cma
+import src.algo.subspace as subspace
 
 class CMA_ES:
-    def __init__(self, nums: int, seed_population: np.array, objective_function: callable, bounds: (int, int)):
+    def __init__(self, nums: int, seed_population: np.array, objective_function: callable, bounds: (int, int),
+                 population_evaluator=None, lattice: dedup.LatticeIndex = None):
+        """
+        :param lattice: campaign-wide index of evaluated integer vectors, duplicates are not executed again
+        """
         self.nums = nums
         self._dim = nums
         self._seed_population = seed_population
         self.obj_func = objective_function
+        self._evaluator = population_evaluator or evaluator.SerialEvaluator(objective_function)
+        self._lattice = lattice
+        # values reused from the lattice index by the last _evaluate_population
+        self._reused = 0
         self._lower_bound = bounds[0]
         self._upper_bound = bounds[1]
+        # coordinates searched at a time on long inputs, a new subspace per restart; None searches all of them
+        self._subspace = subspace.make(nums, seed_population)
+
+    def _full(self, solutions) -> np.ndarray:
+        if self._subspace is not None:
+            return self._subspace.embed(solutions)
+        return np.array(solutions, dtype=float)
+
+    def _local(self, x: np.ndarray) -> np.ndarray:
+        if self._subspace is not None:
+            return self._subspace.project(x)
+        return x.copy()
 
     def _objective_function(self, x):
         x_int = np.rint(x).astype(int)
         diff, c_cov = self.obj_func(x_int)
         return -abs(diff)
 
+    def _evaluate_population(self, solutions: list) -> list:
+        xs = np.rint(self._full(solutions)).astype(int)
+        if self._lattice is not None:
+            values, self._reused = self._lattice.evaluate(self._evaluator, xs)
+            return [-abs(diff) for diff, _ in values]
+        return [-abs(diff) for diff, _ in self._evaluator.evaluate(xs)]
+
+    def _fill(self, solutions: list, popsize: int, best_overall_solution):
+        # current strategies: hold half siblings from last generation and
+        # merge the other half from initial seed population
+        num_seeds = min(popsize // 10, len(self._seed_population))
+        seed_indices = np.random.choice(len(self._seed_population), num_seeds, replace=False)
+        for i, seed_idx in enumerate(seed_indices):
+            solutions[i] = self._local(self._seed_population[seed_idx])
+        if best_overall_solution is not None:
+            solutions[-1] = self._local(best_overall_solution)
+
     """
     candidates: seeds 
     num_iterations: set the generation number
@@ -35,29 +77,42 @@ class CMA_ES:
             'verb_disp': 1,
             'verb_log': 0,
             'tolfun': 1e-6,
+            # separable CMA: linear time and memory in the dimension
+            'CMA_diagonal': sep_cma.separable(self._dim if self._subspace is None else self._subspace.k),
         }
         best_overall_solution = None
         best_overall_value = np.inf
 
-        for _ in range(num_iterations):
+        for i in range(num_iterations):
             x0 = random.choice(self._seed_population)
+            if self._subspace is not None:
+                if i > 0:
+                    # the best input so far is the base of the next subspace; the first restart has no
+                    # previous best to measure its gain against
+                    gain = last_value - best_overall_value if np.isfinite(last_value) else None
+                    self._subspace.rotate(best_overall_solution, gain)
+                x0 = self._subspace.base if best_overall_solution is None else best_overall_solution
+                x0 = self._local(x0)
+                last_value = best_overall_value
             sigma = 10000
             es = cma.CMAEvolutionStrategy(x0, sigma, opts)
             NGEN = 50  # gen times
             for gen in range(NGEN):
                 solutions = es.ask()
-                # current strategies: hold half siblings from last generation and
-                # merge the other half from initial seed population
-                num_seeds = min(popsize // 10, len(self._seed_population))
-                seed_indices = np.random.choice(len(self._seed_population), num_seeds, replace=False)
-                for i, seed_idx in enumerate(seed_indices):
-                    solutions[i] = self._seed_population[seed_idx].copy()
-                if best_overall_solution is not None:
-                    solutions[-1] = best_overall_solution.copy()
-                fitnesses = [self._objective_function(sol) for sol in solutions]
-                es.tell(solutions, fitnesses)
+                self._fill(solutions, popsize, best_overall_solution)
+                fitnesses = self._evaluate_population(solutions)
+                if self._reused:
+                    # the executions saved on duplicates go to new samples
+                    extra = dedup.fresh(self._lattice, es.ask, self._reused, embed=self._full)
+                    if extra:
+                        fitnesses = fitnesses + self._evaluate_population(extra)
+                        solutions = solutions + extra
+                with warnings.catch_warnings():
+                    # generations grow by the candidates resampled for duplicates
+                    warnings.filterwarnings('ignore', message='The number of solutions passed to `tell` should.*')
+                    es.tell(solutions, fitnesses)
                 es.disp()
-            best_solution = np.rint(es.result.xbest).astype(int)
+            best_solution = np.rint(self._full([es.result.xbest])[0]).astype(int)
             best_value = es.result.fbest
             print("CMA-ES best solution：")
             print(best_solution)
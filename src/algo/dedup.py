@@ -0,0 +1,128 @@
+import hashlib
+import collections
+import numpy as np
+import src.algo.evaluator as evaluator
+
+"""
+Deduplication of rounded candidates.
+Late in a run many candidates round to the same integer vector. The lattice index remembers
+the objective values of evaluated integer vectors, within and across generations, so a duplicate
+gets its value reused instead of being executed again; engines spend the executions saved on
+extra samples which the index has not seen.
+Two tiers keep the memory bounded: an exact tier (hash of the vector -> value, least recently
+used evicted) and a Bloom filter which remembers every vector ever evaluated, without values,
+to keep resampled candidates away from known vectors.
+Only executed values are remembered: the predictions of a screening evaluator are not.
+"""
+
+BLOOM_HASHES = 4
+
+def _digest(row: np.ndarray) -> bytes:
+    return hashlib.blake2b(row.tobytes(), digest_size=16).digest()
+
+class LatticeIndex:
+    def __init__(self, max_entries: int = 200_000, bloom_bits: int = 1 << 27):
+        self.max_entries = max_entries
+        self._values = collections.OrderedDict()
+        self._bloom = np.zeros(bloom_bits // 8, dtype=np.uint8)
+        self._bloom_bits = bloom_bits
+        self.hits = 0
+        self.misses = 0
+
+    def __getstate__(self):
+        # the Bloom filter is 16 MiB, checkpoints keep the exact tier and rebuild the filter from it;
+        # evicted vectors are forgotten on resume
+        state = self.__dict__.copy()
+        state['_bloom'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._bloom = np.zeros(self._bloom_bits // 8, dtype=np.uint8)
+        for digest in self._values:
+            self._add_bloom(digest)
+
+    @staticmethod
+    def rows(xs: np.ndarray) -> np.ndarray:
+        return np.ascontiguousarray(xs, dtype=np.int64)
+
+    def _bloom_positions(self, digest: bytes) -> list:
+        # double hashing over the two 64-bit halves of the digest
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self._bloom_bits for i in range(BLOOM_HASHES)]
+
+    def _in_bloom(self, digest: bytes) -> bool:
+        return all(self._bloom[p >> 3] & (1 << (p & 7)) for p in self._bloom_positions(digest))
+
+    def _add_bloom(self, digest: bytes):
+        for p in self._bloom_positions(digest):
+            self._bloom[p >> 3] |= 1 << (p & 7)
+
+    def known(self, xs: np.ndarray) -> np.ndarray:
+        """
+        whether each integer vector was evaluated before (Bloom filter, false positives possible)
+        """
+        return np.array([self._in_bloom(_digest(row)) for row in self.rows(xs)], dtype=bool)
+
+    def evaluate(self, population_evaluator, xs: np.ndarray) -> (list, int):
+        """
+        objective values of the integer vectors xs, shape (n, dim), only unseen vectors are executed
+        :return: values in order, number of values reused instead of executed
+        """
+        rows = self.rows(xs)
+        digests = [_digest(row) for row in rows]
+        values = [None] * len(rows)
+        todo = {}
+        for i, d in enumerate(digests):
+            value = self._values.get(d)
+            if value is not None:
+                self._values.move_to_end(d)
+                values[i] = value
+            elif d not in todo:
+                todo[d] = i
+        if todo:
+            first = list(todo.values())
+            computed = {}
+            results = population_evaluator.evaluate(xs[first])
+            executed = set(evaluator.executed_indices(population_evaluator, len(first)).tolist())
+            for j, (i, value) in enumerate(zip(first, results)):
+                # maps of the novelty objective are not kept, a duplicate brings no new edge anyway
+                computed[digests[i]] = (value[0], None if isinstance(value[1], (bytes, bytearray)) else value[1])
+                if j in executed:
+                    self._store(digests[i], computed[digests[i]])
+                values[i] = value
+            for i, d in enumerate(digests):
+                if values[i] is None:
+                    values[i] = computed[d]
+        reused = len(rows) - len(todo)
+        self.hits += reused
+        self.misses += len(todo)
+        return values, reused
+
+    def _store(self, digest: bytes, value: tuple):
+        self._values[digest] = value
+        self._add_bloom(digest)
+        if len(self._values) > self.max_entries:
+            self._values.popitem(last=False)
+
+def fresh(index: LatticeIndex, sample: callable, n: int, attempts: int = 3, embed: callable = None) -> list:
+    """
+    up to n new candidates whose rounded vectors neither the index nor each other contain
+    :param sample: draws k candidates (continuous vectors)
+    :param embed: maps candidates to the evaluated vectors, e.g. Subspace.embed
+    """
+    chosen = []
+    seen = set()
+    for _ in range(attempts):
+        if len(chosen) >= n:
+            break
+        candidates = sample(n - len(chosen))
+        vectors = np.array(candidates, dtype=float) if embed is None else embed(candidates)
+        rows = LatticeIndex.rows(np.rint(vectors))
+        for candidate, row, known in zip(candidates, rows, index.known(rows)):
+            key = row.tobytes()
+            if not known and key not in seen:
+                seen.add(key)
+                chosen.append(candidate)
+    return chosen[:n]
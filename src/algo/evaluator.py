@@ -0,0 +1,133 @@
+import pickle
+import asyncio
+import multiprocessing as mp
+import multiprocessing.util as mp_util
+import numpy as np
+import src.utils.config as config
+import src.diff_oracle.checker.base_checker as base_checker
+import src.utils.divergence_log as divergence_log
+import src.algo.surrogate as surrogate
+
+"""
+Population evaluators used by the CMA engines.
+evaluate() takes the rounded candidates of one generation, shape (n, dim), and returns
+the objective values (diff, c_cov) in population order.
+Checker objectives are split into a batch encoder and Base_Checker.cached_F, so a generation
+is encoded to program inputs in one vectorized call.
+"""
+
+def split_objective(objective_function: callable) -> (callable, callable):
+    """
+    (batch encoder, objective on encoded inputs), (None, objective_function) when there is no batch encoder
+    """
+    checker = getattr(objective_function, '__self__', None)
+    encode = base_checker.BATCH_ENCODERS.get(getattr(objective_function, '__name__', None))
+    if encode is None or not isinstance(checker, base_checker.Base_Checker):
+        return None, objective_function
+    return encode, checker.cached_F
+
+class SerialEvaluator:
+    def __init__(self, objective_function: callable):
+        self._encode, self._obj_func = split_objective(objective_function)
+
+    def evaluate(self, xs: np.ndarray) -> list:
+        inputs = self._encode(xs) if self._encode is not None else xs
+        return [self._obj_func(x) for x in inputs]
+
+    def close(self):
+        pass
+
+# objective function owned by the current pool worker
+_worker_obj_func = None
+
+def load_objective(payload: bytes) -> callable:
+    """
+    objective of a child process: unpickling gives it its own checker and handler pair,
+    the reports and the divergence log are flushed when the process exits
+    """
+    obj_func = pickle.loads(payload)
+    checker = getattr(obj_func, '__self__', None)
+    store = getattr(checker, 'eval_store', None)
+    if store is not None:
+        mp_util.Finalize(None, store.report, exitpriority=20)
+    for h in (getattr(checker, 'c_handler', None), getattr(checker, 'r_handler', None)):
+        if h is not None:
+            mp_util.Finalize(None, h.report, exitpriority=20)
+    if isinstance(checker, base_checker.Base_Checker):
+        mp_util.Finalize(None, checker.report_divergences, exitpriority=20)
+    # pool workers skip atexit, the queued divergence records are written out here
+    mp_util.Finalize(None, divergence_log.close, exitpriority=30)
+    # sandboxes and the coverage map are per process, the worker builds its own on first use
+    return obj_func
+
+def _init_worker(payload: bytes):
+    global _worker_obj_func
+    _worker_obj_func = load_objective(payload)
+
+def _worker_evaluate(x):
+    return _worker_obj_func(x)
+
+class PoolEvaluator:
+    def __init__(self, objective_function: callable, workers: int):
+        """
+        :param objective_function: picklable objective, usually a bound checker method
+        :param workers: number of worker processes
+        """
+        self._workers = workers
+        # workers receive encoded inputs, cheaper to pickle than the candidate rows
+        self._encode, obj_func = split_objective(objective_function)
+        ctx = mp.get_context('fork')
+        self._pool = ctx.Pool(workers, initializer=_init_worker,
+                              initargs=(pickle.dumps(obj_func),))
+
+    def evaluate(self, xs: np.ndarray) -> list:
+        inputs = self._encode(xs) if self._encode is not None else list(xs)
+        chunksize = max(1, len(inputs) // (self._workers * 4))
+        return self._pool.map(_worker_evaluate, inputs, chunksize=chunksize)
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+
+class AsyncEvaluator:
+    def __init__(self, objective_function: callable, concurrency: int):
+        """
+        :param objective_function: bound objective of a checker, e.g. checker.int_step_objective
+        :param concurrency: candidates in flight, each runs its C and Rust process concurrently
+        """
+        self._checker = objective_function.__self__
+        self._encode = base_checker.BATCH_ENCODERS[objective_function.__name__]
+        self._concurrency = concurrency
+
+    def evaluate(self, xs: np.ndarray) -> list:
+        return asyncio.run(self._checker.F_batch(self._encode(xs), self._concurrency))
+
+    def close(self):
+        pass
+
+def _make_executing_evaluator(objective_function: callable):
+    if config.islands > 1 or config.parallel_arms > 1:
+        # every island / concurrently scheduled arm evaluates its own generations
+        return SerialEvaluator(objective_function)
+    if config.async_concurrency > 0:
+        return AsyncEvaluator(objective_function, config.async_concurrency)
+    if config.workers > 1:
+        return PoolEvaluator(objective_function, config.workers)
+    return SerialEvaluator(objective_function)
+
+def executed_indices(population_evaluator, n: int) -> np.ndarray:
+    """
+    indices of the values of the last evaluate() of n candidates which come from an execution,
+    not from a surrogate prediction
+    """
+    executed = getattr(population_evaluator, 'last_executed', None)
+    return np.arange(n) if executed is None else executed
+
+def make_evaluator(objective_function: callable):
+    """
+    build the evaluator selected in config
+    """
+    population_evaluator = _make_executing_evaluator(objective_function)
+    if config.surrogate:
+        return surrogate.ScreeningEvaluator(population_evaluator, config.surrogate_keep, config.surrogate_explore)
+    return population_evaluator
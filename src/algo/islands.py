@@ -0,0 +1,89 @@
+import sys
+import queue
+import random
+import pickle
+import multiprocessing as mp
+import numpy as np
+import src.utils.config as config
+import src.algo.mo_cma as mo_cma
+import src.algo.evaluator as evaluator
+import src.algo.novelty as novelty
+import src.algo.dedup as dedup
+
+"""
+Island model for MO_CMA_ES.
+K islands run independent strategies in their own processes, each with its own checker and
+handlers (unpickled like the pool workers), seeded from a different slice of the seed population.
+Every `interval` generations an island sends the first Pareto front of its parents, at most
+`migrants` of them, to the next island of the ring and injects the ones it received into its
+next generation.
+Divergences of all islands go to the same divergence log (and eval cache when configured).
+"""
+
+class Migration:
+    def __init__(self, inbox: mp.Queue, outbox: mp.Queue, interval: int, migrants: int):
+        self.interval = interval
+        self.migrants = migrants
+        self._inbox = inbox
+        self._outbox = outbox
+
+    def exchange(self, gen: int, front: list) -> list:
+        """
+        send the best individuals on migration generations, return the received ones (plain lists)
+        """
+        if gen == 0 or gen % self.interval:
+            return []
+        try:
+            self._outbox.put_nowait([list(map(float, ind)) for ind in front[:self.migrants]])
+        except queue.Full:
+            # the next island is behind, it still has earlier migrants to take
+            pass
+        received = []
+        while True:
+            try:
+                received.extend(self._inbox.get_nowait())
+            except queue.Empty:
+                break
+        return received[-self.migrants:]
+
+def _island(index: int, payload: bytes, dim: int, seeds: np.ndarray, bounds: tuple, rng_seed: int,
+            migration: Migration):
+    # forked islands would otherwise draw the same random numbers
+    np.random.seed(rng_seed)
+    random.seed(rng_seed)
+    obj_func = evaluator.load_objective(payload)
+    virgin_map = novelty.VirginMap() if config.cov_novelty else None
+    lattice = dedup.LatticeIndex(config.dedup_size) if config.dedup else None
+    runner = mo_cma.MO_CMA_ES(dim, seeds, obj_func, bounds, evaluator.make_evaluator(obj_func), virgin_map,
+                              migration, lattice)
+    runner.run()
+
+def split_seeds(seeds: np.ndarray, islands: int) -> list:
+    """
+    disjoint shuffled slices, islands share the whole population when it is too small to split
+    """
+    if len(seeds) < 4 * islands:
+        return [seeds] * islands
+    return np.array_split(seeds[np.random.permutation(len(seeds))], islands)
+
+def run_islands(dim: int, seeds: np.ndarray, objective_function: callable, bounds: tuple, islands: int,
+                interval: int, migrants: int):
+    ctx = mp.get_context('fork')
+    payload = pickle.dumps(objective_function)
+    inboxes = [ctx.Queue(maxsize=4) for _ in range(islands)]
+    base_seed = np.random.randint(2 ** 31)
+    procs = []
+    for i, part in enumerate(split_seeds(seeds, islands)):
+        # ring topology: island i sends to island i + 1
+        migration = Migration(inboxes[i], inboxes[(i + 1) % islands], interval, migrants)
+        p = ctx.Process(target=_island, name="island-{}".format(i),
+                        args=(i, payload, dim, part, bounds, base_seed + i, migration))
+        p.start()
+        procs.append(p)
+    for p in procs:
+        p.join()
+        if p.exitcode != 0:
+            print("Error: {} exited with code {}".format(p.name, p.exitcode), file=sys.stderr)
+    for q in inboxes:
+        q.close()
+        q.cancel_join_thread()
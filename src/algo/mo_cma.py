@@ -1,30 +1,86 @@
 import numpy as np
 import random
+import pickle
 from deap import base, creator, tools
-from deap.cma import StrategyMultiObjective
+import src.algo.evaluator as evaluator
+import src.algo.novelty as novelty
+import src.algo.dedup as dedup
+import src.algo.sep_cma as sep_cma
+import src.algo.subspace as subspace
+import src.utils.config as config
 
+def _create_types():
+    # individuals of a checkpointed strategy unpickle as creator.Individual
+    creator.create("FitnessMulti", base.Fitness, weights=(1.0, 0.1))
+    creator.create("Individual", list, fitness=creator.FitnessMulti)
 
 class MO_CMA_ES:
 
-    def __init__(self, dim: int, seed_population: np.array, objective_function: callable, bounds: (np.array, np.array)):
+    def __init__(self, dim: int, seed_population: np.array, objective_function: callable, bounds: (np.array, np.array),
+                 population_evaluator=None, virgin_map: novelty.VirginMap = None, migration=None,
+                 lattice: dedup.LatticeIndex = None, checkpoint: callable = None, resume_state: bytes = None):
         """
         :param dim: vector dimension
         :param seed_population: initial population, shape: (n, dim)
         :param objective_function: objective function, return diff, code coverage
+        :param population_evaluator: evaluates a whole generation, e.g. evaluator.PoolEvaluator, serial by default
+        :param virgin_map: campaign-wide edge map, when given the second objective is coverage novelty
+        :param migration: exchange with the other islands (islands.Migration), None for a single strategy
+        :param lattice: campaign-wide index of evaluated integer vectors, duplicates are not executed again
+        :param checkpoint: called with the pickled search state every config.checkpoint_interval generations
+        :param resume_state: search state saved by a checkpoint, the run continues from it
         """
         self._dim = dim
         self._seed_population = seed_population
         self._obj_func = objective_function
+        self._evaluator = population_evaluator or evaluator.SerialEvaluator(objective_function)
+        self._virgin_map = virgin_map
+        self._migration = migration
+        self._lattice = lattice
+        self._checkpoint = checkpoint
+        self._resume_state = resume_state
+        # values reused from the lattice index by the last _evaluate_population
+        self._reused = 0
         self._lower_bound = bounds[0]
         self._upper_bound = bounds[1]
         self._lambda = min(200, len(self._seed_population))
         self._mu = self._lambda // 2
+        # coordinates searched at a time on long inputs, None searches all of them
+        self._subspace = subspace.make(dim, seed_population)
 
     def _evaluate(self, x):
         x_int = np.rint(x).astype(int)
         diff, c_cov = self._obj_func(x_int)
         return (abs(diff), c_cov)
 
+    def _full(self, population) -> np.ndarray:
+        """
+        evaluated vectors of the individuals, embedded into the input in subspace mode
+        """
+        if self._subspace is not None:
+            return self._subspace.embed(population)
+        return np.array(population, dtype=float)
+
+    def _local(self, x) -> list:
+        """
+        coordinates of an input vector in the search space
+        """
+        if self._subspace is not None:
+            return self._subspace.project(x).tolist()
+        return list(x)
+
+    def _evaluate_population(self, population) -> list:
+        xs = np.rint(self._full(population)).astype(int)
+        if self._lattice is not None:
+            values, self._reused = self._lattice.evaluate(self._evaluator, xs)
+        else:
+            values = self._evaluator.evaluate(xs)
+        if self._virgin_map is not None:
+            # objective returns packed hit maps, score the generation against the campaign map
+            scores = self._virgin_map.score([c_cov for _, c_cov in values], xs)
+            return [(abs(diff), float(score)) for (diff, _), score in zip(values, scores)]
+        return [(abs(diff), c_cov) for diff, c_cov in values]
+
     def _validity(self, ind):
         arr = np.array(ind)
         return np.all(arr >= self._lower_bound) and np.all(arr <= self._upper_bound)
@@ -39,17 +95,17 @@ class MO_CMA_ES:
         return sum((f - o) ** 2 for f, o in zip(feasible_ind, original_ind))
 
     def _setup(self):
-        creator.create("FitnessMulti", base.Fitness, weights=(1.0, 0.1))
-        creator.create("Individual", list, fitness=creator.FitnessMulti)
+        _create_types()
+        pop = self._init_pop()
+        for ind, fit in zip(pop, self._evaluate_population(pop)):
+            ind.fitness.values = fit
+        strategy = sep_cma.make_strategy(pop, sigma=10000, lambda_=self._lambda, mu=self._mu)
+        return self._tools(strategy)
 
+    def _tools(self, strategy, logbook: tools.Logbook = None, hof: tools.HallOfFame = None):
         toolbox = base.Toolbox()
         toolbox.register("evaluate", self._evaluate)
         # toolbox.decorate("evaluate", tools.ClosestValidPenalty(self._validity, self._feasible, 1.0e+6, self._distance))
-
-        pop = self._init_pop()
-        for ind in pop:
-            ind.fitness.values = toolbox.evaluate(ind)
-        strategy = StrategyMultiObjective(pop, sigma=10000, lambda_=self._lambda, mu=self._mu)
         toolbox.register("generate", strategy.generate, creator.Individual)
         toolbox.register("update", strategy.update)
 
@@ -57,36 +113,92 @@ class MO_CMA_ES:
         stats.register("min", np.min, axis=0)
         stats.register("max", np.max, axis=0)
 
-        logbook = tools.Logbook()
-        logbook.header = ["gen", "nevals"] + (stats.fields if stats else [])
-        hof = tools.HallOfFame(1)
+        if logbook is None:
+            logbook = tools.Logbook()
+            logbook.header = ["gen", "nevals"] + (stats.fields if stats else [])
+        if hof is None:
+            hof = tools.HallOfFame(1)
         return toolbox, strategy, stats, logbook, hof
 
+    def _save(self, strategy, logbook, hof, gen: int, stag_cnt: int, best_fitness: float,
+              overall_best_fitness: float) -> bytes:
+        return pickle.dumps({
+            'strategy': strategy, 'logbook': logbook, 'hof': hof, 'gen': gen, 'stag_cnt': stag_cnt,
+            'best_fitness': best_fitness, 'overall_best_fitness': overall_best_fitness, 'subspace': self._subspace,
+        })
+
+    def _restore(self, resume_state: bytes):
+        _create_types()
+        state = pickle.loads(resume_state)
+        self._subspace = state.get('subspace')
+        toolbox, strategy, stats, logbook, hof = self._tools(state['strategy'], state['logbook'], state['hof'])
+        return (toolbox, strategy, stats, logbook, hof, state['gen'], state['stag_cnt'], state['best_fitness'],
+                state['overall_best_fitness'])
+
     def _init_pop(self):
         num_seeds = min(self._lambda, len(self._seed_population))
         pop = [None] * num_seeds
         seed_indices = np.random.choice(len(self._seed_population), num_seeds, replace=False)
         for i, seed_idx in enumerate(seed_indices):
             seed = self._seed_population[seed_idx].astype(float)
-            pop[i] = creator.Individual(seed.tolist())
+            pop[i] = creator.Individual(self._local(seed))
         return pop
 
     def _diverse(self, population):
         num_seeds = self._lambda // 4
         seed_indices = np.random.choice(len(self._seed_population), num_seeds, replace=False)
         for i, seed_idx in enumerate(seed_indices):
-            population[i][:] = creator.Individual(self._seed_population[seed_idx].tolist())
+            population[i][:] = creator.Individual(self._local(self._seed_population[seed_idx]))
+
+    def _migrate(self, gen: int, strategy, population):
+        """
+        send the first front of the parents to the next island, received migrants replace
+        the last offspring of the generation, like _diverse does with seeds
+        """
+        if self._migration is None:
+            return
+        front = tools.sortLogNondominated(strategy.parents, len(strategy.parents), first_front_only=True)
+        front = sorted(front, key=lambda ind: ind.fitness.values, reverse=True)
+        migrants = self._migration.exchange(gen, list(self._full(front)) if front else [])
+        for i, migrant in enumerate(migrants[:len(population) // 4]):
+            population[-1 - i][:] = self._local(migrant)
+
+    def _rotate(self, strategy, hof, window_start: tuple):
+        """
+        freeze the best vector of the subspace and move to the next one
+        :param window_start: best fitness of the initial population of the subspace
+        """
+        best = hof[0].fitness.values if len(hof) else window_start
+        gain = (best[0] - window_start[0]) + max(0.0, best[1] - window_start[1])
+        best_ind = hof[0] if len(hof) else max(strategy.parents, key=lambda ind: ind.fitness.values)
+        self._subspace.rotate(self._full([best_ind])[0], gain)
+        print("subspace: rotation {}, {} coordinates from {}, gain {:.4g}".format(
+            self._subspace.rotations, self._subspace.k, self._subspace.indices[0], gain))
 
-    def run(self, NGEN: int = 150):
-        toolbox, strategy, stats, logbook, hof = self._setup()
-        stag_cnt, stag_limit = 0, 10
-        best_fitness = 0.0
-        overall_best_fitness = 0.0
+    def run(self, NGEN: int = 150) -> bytes:
+        """
+        :return: pickled search state after generation NGEN, resume_state of a run continuing the search
+        """
+        stag_limit = 10
+        if self._resume_state is not None:
+            (toolbox, strategy, stats, logbook, hof, start, stag_cnt, best_fitness,
+             overall_best_fitness) = self._restore(self._resume_state)
+        else:
+            toolbox, strategy, stats, logbook, hof = self._setup()
+            start, stag_cnt = 0, 0
+            best_fitness = 0.0
+            overall_best_fitness = 0.0
+        window_start = max(ind.fitness.values for ind in strategy.parents)
 
-        for gen in range(NGEN):
+        for gen in range(start, NGEN):
+            if self._subspace is not None and gen > 0 and gen % config.subspace_period == 0:
+                self._rotate(strategy, hof, window_start)
+                toolbox, strategy, stats, logbook, hof = self._setup()
+                window_start = max(ind.fitness.values for ind in strategy.parents)
             population = toolbox.generate()
             if best_fitness != 0.0:
                 self._diverse(population)
+            self._migrate(gen, strategy, population)
             # have found divergence case, now we need to diverse population to avoid local minimum
             if stag_cnt >= stag_limit:
                 print(f"Restarting CMA-ES at generation {gen} due to stagnation.")
@@ -94,9 +206,17 @@ class MO_CMA_ES:
                 stag_cnt = 0
                 best_fitness = 0.0
                 continue
-            fitness = toolbox.map(toolbox.evaluate, population)
+            fitness = self._evaluate_population(population)
             for ind, fit in zip(population, fitness):
                 ind.fitness.values = fit
+            if self._reused:
+                # the executions saved on duplicates go to new offspring
+                extra = dedup.fresh(self._lattice, lambda k: toolbox.generate()[:k], self._reused,
+                                    embed=self._full)
+                if extra:
+                    for ind, fit in zip(extra, self._evaluate_population(extra)):
+                        ind.fitness.values = fit
+                    population.extend(extra)
             toolbox.update(population)
             hof.update(population)
 
@@ -110,9 +230,12 @@ class MO_CMA_ES:
             record = stats.compile(population) if stats is not None else {}
             logbook.record(gen=gen, nevals=len(population), **record)
             print(logbook.stream)
+            if self._checkpoint is not None and (gen + 1) % config.checkpoint_interval == 0:
+                self._checkpoint(self._save(strategy, logbook, hof, gen + 1, stag_cnt, best_fitness,
+                                            overall_best_fitness))
         # print("\nBest individual found:", hof[0])
         # print("Best fitness:", hof[0].fitness.values)
-        return
+        return self._save(strategy, logbook, hof, max(start, NGEN), stag_cnt, best_fitness, overall_best_fitness)
 
 def convert_seeds_int_step(dim: int, seeds: list[bytes]) -> np.array:
     candidates = []
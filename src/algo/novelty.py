@@ -0,0 +1,95 @@
+import hashlib
+import numpy as np
+import src.diff_oracle.coverage as coverage
+
+# score of one edge never hit before in the campaign, rarity adds at most 1 per hit edge
+NEW_EDGE_WEIGHT = 10.0
+# Bloom filter of the inputs whose maps were counted: bits, hash functions
+SEEN_BITS = 1 << 25
+SEEN_HASHES = 4
+
+class VirginMap:
+    """
+    Campaign-wide edge statistics for the coverage-novelty objective.
+    Keeps how many distinct inputs hit each edge, a candidate is scored by the edges
+    nobody hit before plus a rarity weight 1/sqrt(1 + hits) for the edges it shares.
+    """
+    def __init__(self, size: int = coverage.MAP_SIZE):
+        self._size = size
+        self._counts = np.zeros(size, dtype=np.uint64)
+        self._seen = np.zeros(SEEN_BITS // 8, dtype=np.uint8)
+
+    def __getstate__(self):
+        # the 4 MiB filter of counted inputs is left out of checkpoints, after a resume an input
+        # counted before may be counted once more
+        state = self.__dict__.copy()
+        state['_seen'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._seen = np.zeros(SEEN_BITS // 8, dtype=np.uint8)
+
+    def _first_seen(self, inputs) -> np.ndarray:
+        """
+        whether each input is counted for the first time, and remember it; a few new inputs may
+        pass for known ones (Bloom filter)
+        """
+        first = np.zeros(len(inputs), dtype=bool)
+        for i, x in enumerate(inputs):
+            key = x if isinstance(x, (bytes, bytearray)) else np.ascontiguousarray(x).tobytes()
+            digest = hashlib.blake2b(key, digest_size=16).digest()
+            h1 = int.from_bytes(digest[:8], 'little')
+            h2 = int.from_bytes(digest[8:], 'little') | 1
+            positions = [(h1 + k * h2) % SEEN_BITS for k in range(SEEN_HASHES)]
+            if not all(self._seen[p >> 3] & (1 << (p & 7)) for p in positions):
+                first[i] = True
+                for p in positions:
+                    self._seen[p >> 3] |= 1 << (p & 7)
+        return first
+
+    def _unpack(self, packed_maps: list) -> np.ndarray:
+        rows = np.zeros((len(packed_maps), self._size), dtype=bool)
+        valid = [i for i, m in enumerate(packed_maps) if isinstance(m, (bytes, bytearray))]
+        if valid:
+            # maps only cover the guards of the program, pad them to the same width
+            width = max(len(packed_maps[i]) for i in valid)
+            packed = np.zeros((len(valid), width), dtype=np.uint8)
+            for row, i in enumerate(valid):
+                m = packed_maps[i]
+                packed[row, :len(m)] = np.frombuffer(m, dtype=np.uint8)
+            bits = np.unpackbits(packed, axis=1)[:, :self._size]
+            rows[valid, :bits.shape[1]] = bits.astype(bool)
+        return rows
+
+    def score(self, packed_maps: list, inputs=None) -> np.ndarray:
+        """
+        score a whole generation against the map, then merge it into the map
+        :param packed_maps: np.packbits'ed hit maps, None for runs without coverage
+        :param inputs: evaluated input of each map, maps of inputs counted before (repeated or
+                       cached evaluations) are scored but not counted again
+        """
+        rows = self._unpack(packed_maps)
+        new_edges = np.count_nonzero(rows & (self._counts == 0), axis=1)
+        rarity = rows @ (1.0 / np.sqrt(1.0 + self._counts))
+        counted = np.array([isinstance(m, (bytes, bytearray)) for m in packed_maps], dtype=bool)
+        if inputs is not None:
+            counted &= self._first_seen(inputs)
+        # identical maps of one generation are counted once
+        distinct = {}
+        for i in np.flatnonzero(counted):
+            distinct.setdefault(packed_maps[i], i)
+        self._counts += rows[list(distinct.values())].sum(axis=0, dtype=np.uint64)
+        return new_edges * NEW_EDGE_WEIGHT + rarity
+
+    def edges_seen(self) -> int:
+        return int(np.count_nonzero(self._counts))
+
+    def counts(self) -> np.ndarray:
+        return self._counts.copy()
+
+    def merge(self, delta: np.ndarray):
+        """
+        add the hits another process counted on its copy of the map (its counts minus the ones it started from)
+        """
+        self._counts += delta
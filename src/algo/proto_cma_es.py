@@ -1,12 +1,15 @@
 import cma
 import math
+import pickle
 import numpy as np
 from typing import List
+import src.utils.config as config
 import src.diff_oracle.protobuf.proto_buf as proto_buf
 
 class PROTO_CMA_ES:
     def __init__(self, x0: np.array, objective_function: callable, bounds: tuple[np.ndarray, np.ndarray],
-                 field_info: List, handler: proto_buf.ProtobufHandler):
+                 field_info: List, handler: proto_buf.ProtobufHandler, steady_state=None,
+                 checkpoint: callable = None, resume_state: bytes = None):
         """
         Initialize CMA-ES optimizer with a single starting point and dimension-specific bounds.
 
@@ -16,6 +19,11 @@ class PROTO_CMA_ES:
             bounds: Either (lower_bound, upper_bound) for uniform bounds,
                   or ([lower_bound_1, lower_bound_2, ...], [upper_bound_1, upper_bound_2, ...])
                   for dimension-specific bounds
+            steady_state: steady_state.SteadyStateDriver evaluating candidates asynchronously, replaces the
+                  generational loop when given
+            checkpoint: called with the pickled search state every config.checkpoint_interval generations
+                  (generational loop only)
+            resume_state: search state saved by a checkpoint, the run continues from it
         """
         self._seed = x0
         self._dim = len(x0)
@@ -29,6 +37,9 @@ class PROTO_CMA_ES:
 
         self._field_info = field_info
         self._proto_handler = handler
+        self._steady_state = steady_state
+        self._checkpoint = checkpoint
+        self._resume_state = resume_state
 
         if len(self._lower_bound) != self._dim or len(self._upper_bound) != self._dim:
             raise ValueError(f"Bounds must have length equal to dimension ({self._dim})")
@@ -43,18 +54,34 @@ class PROTO_CMA_ES:
         Returns:
             Negative absolute difference (for minimization)
         """
+        proto_bytes = self._to_proto(x)
+        if proto_bytes is None:
+            return self._penalty_coefficient
+        try:
+            return self._score(self.obj_func(proto_bytes))
+        except Exception as e:
+            return self._penalty_coefficient
+
+    def _to_proto(self, x):
+        """
+        serialized message of a candidate, None when it is not a valid one
+        """
         try:
             if np.any(np.isnan(x)):
-                return self._penalty_coefficient
+                return None
             x = np.clip(np.rint(x), self._lower_bound, self._upper_bound)
-            # convert vector to raw bytes for execution
             proto_bytes = self._proto_handler.vector_to_protobuf(x, self._field_info)
             if not self._proto_handler.is_valid_msg(proto_bytes):
-                return self._penalty_coefficient
-            diff, c_cov = self.obj_func(proto_bytes)
-            return -abs(diff)
+                return None
+            return proto_bytes
         except Exception as e:
+            return None
+
+    def _score(self, value):
+        if value is None:
             return self._penalty_coefficient
+        diff, c_cov = value
+        return -abs(diff)
 
     def run(self, num_iterations: int = 1, popsize: int = 2000):
         """
@@ -82,20 +109,34 @@ class PROTO_CMA_ES:
 
         best_overall_solution = None
         best_overall_value = float('inf')
+        start_run, start_gen, es = 0, 0, None
+        if self._resume_state is not None:
+            state = pickle.loads(self._resume_state)
+            start_run, start_gen, es = state['run'], state['gen'], state['es']
+            best_overall_solution, best_overall_value = state['best_overall_solution'], state['best_overall_value']
 
-        for i in range(num_iterations):
-            # Use the provided seed
-            x0 = self._seed
-            sigma = 10  # Initial step size
-            # Initialize CMA-ES
-            es = cma.CMAEvolutionStrategy(x0, sigma, opts)
+        for i in range(start_run, num_iterations):
+            if es is None:
+                # Use the provided seed
+                x0 = self._seed
+                sigma = 10  # Initial step size
+                # Initialize CMA-ES
+                es = cma.CMAEvolutionStrategy(x0, sigma, opts)
             # Run optimization for specified generations
             NGEN = 50  # generations
-            for gen in range(NGEN):
-                solutions = es.ask()
-                fitnesses = [self._objective_function(sol) for sol in solutions]
-                es.tell(solutions, fitnesses)
-                es.disp()
+            if self._steady_state is not None:
+                self._steady_state.run(es, NGEN, self._to_proto, self._score)
+            else:
+                for gen in range(start_gen, NGEN):
+                    solutions = es.ask()
+                    fitnesses = [self._objective_function(sol) for sol in solutions]
+                    es.tell(solutions, fitnesses)
+                    es.disp()
+                    if self._checkpoint is not None and (gen + 1) % config.checkpoint_interval == 0:
+                        self._checkpoint(pickle.dumps({
+                            'run': i, 'gen': gen + 1, 'es': es, 'best_overall_solution': best_overall_solution,
+                            'best_overall_value': best_overall_value,
+                        }))
             # Get best solution from this run
             best_solution = np.rint(es.result.xbest).astype(int)
             best_value = es.result.fbest
@@ -106,6 +147,7 @@ class PROTO_CMA_ES:
             if best_value < best_overall_value:
                 best_overall_value = best_value
                 best_overall_solution = best_solution
+            es, start_gen = None, 0
         print("Overall best solution:")
         print(best_overall_solution)
         print(f"Overall objective value: {best_overall_value}")
@@ -2,17 +2,21 @@ import random
 import numpy as np
 from typing import List
 from deap import base, creator, tools
-from deap.cma import StrategyMultiObjective
+import src.utils.config as config
+import src.algo.novelty as novelty
+import src.algo.sep_cma as sep_cma
 import src.diff_oracle.protobuf.proto_buf as proto_buf
 
 class PROTO_MO_CMA_ES:
 
     def __init__(self, dim: int, seed_population: np.array, objective_function: callable, bounds: (np.ndarray, np.ndarray),
-                 field_info: List, proto_handler: proto_buf.ProtobufHandler):
+                 field_info: List, proto_handler: proto_buf.ProtobufHandler, virgin_map: novelty.VirginMap = None):
         """
         :param dim: vector dimension
         :param seed_population: initial population, shape: (n, dim)
         :param objective_function: objective function, return diff, code coverage
+        :param virgin_map: campaign-wide edge map for the coverage-novelty objective, a new one when the
+                           objective is on and none is given
         """
         self._dim = dim
         self._seed_population = seed_population
@@ -21,6 +25,12 @@ class PROTO_MO_CMA_ES:
         self._mu = self._lambda // 2
         self._proto_handler = proto_handler
         self._field_info = field_info
+        if virgin_map is None and config.cov_novelty:
+            virgin_map = novelty.VirginMap()
+        self._virgin_map = virgin_map
+        # hit maps and messages of the current generation in evaluation order, for the novelty objective
+        self._pending_maps = []
+        self._pending_inputs = []
 
         lower_bounds, upper_bounds = bounds
         if len(lower_bounds) == dim and len(upper_bounds) == dim:
@@ -49,10 +59,28 @@ class PROTO_MO_CMA_ES:
     def _evaluate(self, x):
         proto_bytes = self._proto_handler.vector_to_protobuf(x, self._field_info)
         if not self._proto_handler.is_valid_msg(proto_bytes):
+            if self._virgin_map is not None:
+                self._pending_maps.append(None)
+                self._pending_inputs.append(proto_bytes)
             return (-self._penalty_coefficient, -1.0)
         diff, c_cov = self._obj_func(proto_bytes)
+        if self._virgin_map is not None:
+            # placeholder, the novelty score is added once the whole generation is evaluated
+            self._pending_maps.append(c_cov)
+            self._pending_inputs.append(proto_bytes)
+            return (abs(diff), 0.0)
         return (abs(diff), c_cov)
 
+    def _evaluate_population(self, toolbox, population) -> list:
+        self._pending_maps = []
+        self._pending_inputs = []
+        fitness = list(toolbox.map(toolbox.evaluate, population))
+        if self._virgin_map is None:
+            return fitness
+        # the penalty decorator calls _evaluate exactly once per individual, in order
+        scores = self._virgin_map.score(self._pending_maps, self._pending_inputs)
+        return [(diff, cov + float(score)) for (diff, cov), score in zip(fitness, scores)]
+
     def _validity(self, ind):
         proto_bytes = self._proto_handler.vector_to_protobuf(ind, self._field_info)
         if not self._proto_handler.is_valid_msg(proto_bytes):
@@ -97,14 +125,14 @@ class PROTO_MO_CMA_ES:
                                                                self._distance))
 
         pop = self._init_pop()
-        for ind in pop:
-            ind.fitness.values = toolbox.evaluate(ind)
-        strategy = StrategyMultiObjective(pop, sigma=10000, lambda_=self._lambda, mu=self._mu)
+        for ind, fit in zip(pop, self._evaluate_population(toolbox, pop)):
+            ind.fitness.values = fit
+        strategy = sep_cma.make_strategy(pop, sigma=10000, lambda_=self._lambda, mu=self._mu)
         # toolbox.register("generate", strategy.generate, creator.Individual)
         # toolbox.register("update", strategy.update)
 
         # Register bounded generation and update functions
-        toolbox.register("generate", self._bounded_generate, strategy)
+        toolbox.register("generate", self._bounded_generate, strategy, creator.Individual)
         toolbox.register("update", self._bounded_update, strategy)
 
         stats = tools.Statistics(lambda x: x.fitness.values)
@@ -148,7 +176,7 @@ class PROTO_MO_CMA_ES:
                 stag_cnt = 0
                 best_fitness = 0.0
                 continue
-            fitness = toolbox.map(toolbox.evaluate, population)
+            fitness = self._evaluate_population(toolbox, population)
             for ind, fit in zip(population, fitness):
                 ind.fitness.values = fit
             toolbox.update(population)
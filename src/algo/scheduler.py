@@ -0,0 +1,244 @@
+import sys
+import math
+import time
+import queue
+import random
+import pickle
+import multiprocessing as mp
+import numpy as np
+import src.algo.mo_cma as mo_cma
+import src.algo.evaluator as evaluator
+
+"""
+Budget-aware scheduling of the dimension groups of a campaign.
+Every group is an arm of a bandit. An arm runs MO_CMA_ES for a slice of generations, then its
+search is paused (the pickled search state, like a checkpoint) and the next arm is picked by
+discounted UCB over the recent yield of the arms: divergences per evaluation plus coverage gain.
+Arms run until their generation cap or until the wall-clock / evaluation budget of the campaign
+is spent. With `parallel` > 1 several arms run at once, each slice in a forked process like the
+islands; their novelty hits are merged into the campaign map, their dedup index updates are not.
+"""
+
+# weight of the past slices in the yield estimate of an arm
+DISCOUNT = 0.7
+# weight of the UCB exploration bonus
+EXPLORATION = 0.5
+
+class YieldMeter:
+    """
+    evaluator wrapper counting the evaluations, divergences and coverage gain of one slice
+    """
+    def __init__(self, inner, best_cov: float, edges: np.ndarray):
+        self._inner = inner
+        self.evals = 0
+        self.divergences = 0
+        self.cov_gain = 0.0
+        self.best_cov = best_cov
+        # edges hit by the arm so far, novelty runs only
+        self.edges = edges
+
+    def evaluate(self, xs: np.ndarray) -> list:
+        values = self._inner.evaluate(xs)
+        self.evals += len(values)
+        # predicted values of a screening evaluator are no yield
+        executed = [values[i] for i in evaluator.executed_indices(self._inner, len(values))]
+        covs = [c_cov for _, c_cov in executed if c_cov is not None and not isinstance(c_cov, (bytes, bytearray))]
+        maps = [np.frombuffer(c_cov, dtype=np.uint8) for _, c_cov in executed if isinstance(c_cov, (bytes, bytearray))]
+        # the first batch of an arm is its initial population, the baseline of the gains
+        if self.best_cov is None and covs:
+            self.best_cov = max(covs)
+        if self.edges is None and maps:
+            self.edges = np.zeros(max(len(hits) for hits in maps), dtype=np.uint8)
+            for hits in maps:
+                self.edges[:len(hits)] |= hits
+        self.divergences += sum(1 for diff, _ in executed if diff)
+        for hits in maps:
+            self._add_edges(hits)
+        if covs and max(covs) > self.best_cov:
+            # coverage is in percent, the gain a fraction like the divergence rate
+            self.cov_gain += (max(covs) - self.best_cov) / 100
+            self.best_cov = max(covs)
+        return values
+
+    @property
+    def last_executed(self) -> np.ndarray:
+        return getattr(self._inner, 'last_executed', None)
+
+    def _add_edges(self, hits: np.ndarray):
+        if len(self.edges) < len(hits):
+            edges = np.zeros(len(hits), dtype=np.uint8)
+            edges[:len(self.edges)] = self.edges
+            self.edges = edges
+        new = int(np.unpackbits(hits & ~self.edges[:len(hits)]).sum())
+        if new:
+            self.edges[:len(hits)] |= hits
+            # relative growth of the edges the arm has hit
+            self.cov_gain += new / int(np.unpackbits(self.edges).sum())
+
+    def result(self) -> tuple:
+        return self.evals, self.divergences, self.cov_gain, self.best_cov, self.edges
+
+    def close(self):
+        self._inner.close()
+
+class Arm:
+    def __init__(self, index: int, dim: int, seeds: np.ndarray):
+        self.index = index
+        self.dim = dim
+        self.seeds = seeds
+        # pickled search state, None before the first slice
+        self.state = None
+        self.gen = 0
+        self.pulls = 0
+        self.value = 0.0
+        self.evals = 0
+        self.divergences = 0
+        # best coverage of the arm, None before its initial population is evaluated
+        self.best_cov = None
+        self.edges = None
+
+    def update(self, gen: int, state: bytes, result: tuple):
+        evals, divergences, cov_gain, self.best_cov, self.edges = result
+        reward = divergences / max(1, evals) + min(1.0, cov_gain)
+        self.value = reward if self.pulls == 0 else DISCOUNT * self.value + (1 - DISCOUNT) * reward
+        self.gen = gen
+        self.state = state
+        self.pulls += 1
+        self.evals += evals
+        self.divergences += divergences
+
+def _run_slice(arm: Arm, end: int, obj_func: callable, bounds: tuple, population_evaluator, virgin_map,
+               lattice) -> (bytes, tuple):
+    meter = YieldMeter(population_evaluator, arm.best_cov, arm.edges)
+    runner = mo_cma.MO_CMA_ES(arm.dim, arm.seeds, obj_func, bounds, meter, virgin_map, lattice=lattice,
+                              resume_state=arm.state)
+    state = runner.run(end)
+    return state, meter.result()
+
+def _slice_process(payload: bytes, arm: Arm, end: int, bounds: tuple, rng_seed: int, out: mp.Queue, virgin_map,
+                   lattice):
+    # forked slices would otherwise draw the same random numbers
+    np.random.seed(rng_seed)
+    random.seed(rng_seed)
+    obj_func = evaluator.load_objective(payload)
+    base = virgin_map.counts() if virgin_map is not None else None
+    population_evaluator = evaluator.make_evaluator(obj_func)
+    try:
+        state, result = _run_slice(arm, end, obj_func, bounds, population_evaluator, virgin_map, lattice)
+    finally:
+        population_evaluator.close()
+    delta = virgin_map.counts() - base if virgin_map is not None else None
+    out.put((arm.index, end, state, result, delta))
+
+class Scheduler:
+    def __init__(self, arms: list, obj_func: callable, bounds: tuple, max_gens: int, slice_gens: int,
+                 parallel: int = 1, time_budget: float = None, eval_budget: int = None):
+        """
+        :param arms: one Arm per dimension group
+        :param max_gens: generations one arm runs at most
+        :param slice_gens: generations an arm runs before the next pick
+        :param parallel: arms searched at once, in forked processes when > 1
+        :param time_budget: wall-clock seconds of the campaign, None for no limit
+        :param eval_budget: evaluations of the campaign, None for no limit
+        """
+        self.arms = arms
+        self._obj_func = obj_func
+        self._bounds = bounds
+        self.max_gens = max_gens
+        self.slice_gens = slice_gens
+        self.parallel = parallel
+        self.time_budget = time_budget
+        self.eval_budget = eval_budget
+        # spent before a resume
+        self._elapsed = 0.0
+        self._start = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        return self._elapsed + time.monotonic() - self._start
+
+    @property
+    def evals(self) -> int:
+        return sum(arm.evals for arm in self.arms)
+
+    def _budget_left(self) -> bool:
+        if self.time_budget is not None and self.elapsed >= self.time_budget:
+            return False
+        return self.eval_budget is None or self.evals < self.eval_budget
+
+    def _pick(self, busy: set) -> Arm:
+        candidates = [arm for arm in self.arms if arm.gen < self.max_gens and arm.index not in busy]
+        if not candidates:
+            return None
+        for arm in candidates:
+            if arm.pulls == 0:
+                return arm
+        total = sum(arm.pulls for arm in self.arms)
+        return max(candidates, key=lambda arm: arm.value + EXPLORATION * math.sqrt(math.log(total) / arm.pulls))
+
+    def state(self) -> bytes:
+        return pickle.dumps((self.arms, self.elapsed))
+
+    def restore(self, state: bytes):
+        self.arms, self._elapsed = pickle.loads(state)
+        self._start = time.monotonic()
+
+    def run(self, population_evaluator, virgin_map, lattice, save: callable = None):
+        """
+        :param save: called with the scheduler state after every slice
+        """
+        if self.parallel > 1:
+            self._run_parallel(virgin_map, lattice, save)
+            return
+        while self._budget_left():
+            arm = self._pick(set())
+            if arm is None:
+                break
+            end = min(arm.gen + self.slice_gens, self.max_gens)
+            state, result = _run_slice(arm, end, self._obj_func, self._bounds, population_evaluator, virgin_map,
+                                       lattice)
+            arm.update(end, state, result)
+            if save is not None:
+                save(self.state())
+
+    def _run_parallel(self, virgin_map, lattice, save: callable):
+        ctx = mp.get_context('fork')
+        payload = pickle.dumps(self._obj_func)
+        out = ctx.Queue()
+        running = {}
+        while True:
+            while len(running) < self.parallel and self._budget_left():
+                arm = self._pick(set(running))
+                if arm is None:
+                    break
+                end = min(arm.gen + self.slice_gens, self.max_gens)
+                p = ctx.Process(target=_slice_process, name="arm-{}".format(arm.dim),
+                                args=(payload, arm, end, self._bounds, np.random.randint(2 ** 31), out, virgin_map,
+                                      lattice))
+                p.start()
+                running[arm.index] = p
+            if not running:
+                break
+            try:
+                index, end, state, result, delta = out.get(timeout=1.0)
+            except queue.Empty:
+                for index, p in list(running.items()):
+                    if not p.is_alive() and p.exitcode != 0:
+                        # the slice died, the arm is not picked again
+                        print("Error: {} exited with code {}".format(p.name, p.exitcode), file=sys.stderr)
+                        self.arms[index].gen = self.max_gens
+                        del running[index]
+                continue
+            running.pop(index).join()
+            self.arms[index].update(end, state, result)
+            if delta is not None:
+                virgin_map.merge(delta)
+            if save is not None:
+                save(self.state())
+        out.close()
+
+    def report(self):
+        print("scheduler: {} evaluations in {:.0f} s".format(self.evals, self.elapsed), file=sys.stderr)
+        for arm in sorted(self.arms, key=lambda arm: arm.value, reverse=True):
+            print("  dim {}: {} seeds, {} generations, {} evaluations, {} divergences, yield {:.3f}".format(
+                arm.dim, len(arm.seeds), arm.gen, arm.evals, arm.divergences, arm.value), file=sys.stderr)
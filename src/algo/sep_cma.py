@@ -0,0 +1,82 @@
+import numpy as np
+from deap import tools
+from deap.cma import StrategyMultiObjective
+import src.utils.config as config
+
+"""
+Separable (diagonal covariance) MO-CMA-ES for high-dimensional inputs.
+StrategyMultiObjective keeps a Cholesky factor and its inverse per parent, O(mu * n^2) memory
+and O(n^2) time per update, which does not fit byte inputs of several KB. The separable
+strategy keeps the per-coordinate standard deviations instead (O(mu * n) memory, O(n) update),
+with the learning rate of sep-CMA-ES (Ros & Hansen 2008); selection and step-size control are
+the ones of StrategyMultiObjective.
+"""
+
+def separable(dim: int) -> bool:
+    """
+    whether a search of dimension dim uses the separable strategies, per config.cma_mode
+    """
+    if config.cma_mode == 'auto':
+        return dim > config.sep_threshold
+    return config.cma_mode == 'sep'
+
+def make_strategy(population: list, sigma: float, lambda_: int, mu: int):
+    """
+    MO-CMA-ES strategy for the dimension of the population
+    """
+    if separable(len(population[0])):
+        return SepStrategyMultiObjective(population, sigma=sigma, lambda_=lambda_, mu=mu)
+    return StrategyMultiObjective(population, sigma=sigma, lambda_=lambda_, mu=mu)
+
+class SepStrategyMultiObjective(StrategyMultiObjective):
+    """
+    StrategyMultiObjective with a diagonal covariance: A holds the standard deviation of every
+    coordinate, invCholesky their inverses, both vectors
+    """
+    def __init__(self, population, sigma, **params):
+        # the parent constructor would allocate the n x n matrices
+        self.parents = population
+        self.dim = len(self.parents[0])
+
+        self.mu = params.get("mu", len(self.parents))
+        self.lambda_ = params.get("lambda_", 1)
+
+        self.d = params.get("d", 1.0 + self.dim / 2.0)
+        self.ptarg = params.get("ptarg", 1.0 / (5.0 + 0.5))
+        self.cp = params.get("cp", self.ptarg / (2.0 + self.ptarg))
+
+        self.cc = params.get("cc", 2.0 / (self.dim + 2.0))
+        # a diagonal learns (n + 2) / 3 times faster than a full covariance matrix
+        self.ccov = params.get("ccov", min(1.0, 2.0 / (self.dim ** 2 + 6.0) * (self.dim + 2.0) / 3.0))
+        self.pthresh = params.get("pthresh", 0.44)
+
+        self.sigmas = [sigma] * len(population)
+        self.A = [np.ones(self.dim) for _ in range(len(population))]
+        self.invCholesky = [np.ones(self.dim) for _ in range(len(population))]
+        self.pc = [np.zeros(self.dim) for _ in range(len(population))]
+        self.psucc = [self.ptarg] * len(population)
+
+        self.indicator = params.get("indicator", tools.hypervolume)
+
+    def generate(self, ind_init):
+        arz = np.random.randn(self.lambda_, self.dim)
+        individuals = list()
+
+        for i, p in enumerate(self.parents):
+            p._ps = "p", i
+
+        if self.lambda_ == self.mu:
+            parent_indices = range(self.lambda_)
+        else:
+            # parents producing an offspring are chosen at random from the first front
+            ndom = tools.sortLogNondominated(self.parents, len(self.parents), first_front_only=True)
+            parent_indices = [ndom[np.random.randint(0, len(ndom))]._ps[1] for _ in range(self.lambda_)]
+        for i, p_idx in enumerate(parent_indices):
+            individuals.append(ind_init(self.parents[p_idx] + self.sigmas[p_idx] * self.A[p_idx] * arz[i]))
+            individuals[-1]._ps = "o", p_idx
+        return individuals
+
+    def _rankOneUpdate(self, invCholesky, A, alpha, beta, v):
+        # diagonal of alpha * C + beta * v v^T
+        A = np.sqrt(alpha * A ** 2 + beta * v ** 2)
+        return 1.0 / A, A
@@ -0,0 +1,90 @@
+import sys
+import pickle
+import collections
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+import src.algo.evaluator as evaluator
+
+"""
+Steady-state ask/tell driver for pycma strategies.
+Candidates are dispatched to the worker processes one by one as workers free up, the strategy
+is told as soon as popsize results are in, whichever candidates they belong to, so one slow
+or hanging input no longer holds back a whole generation.
+A result arriving more than `max_age` tells after its candidate was asked is a straggler: it is
+not told (the distribution has moved on), it goes to the late-result path which keeps the best
+value found and injects an improving straggler into the next ask.
+"""
+
+class SteadyStateDriver:
+    def __init__(self, objective_function: callable, workers: int, max_age: int = 1):
+        """
+        :param objective_function: picklable objective, usually a bound checker method
+        :param workers: worker processes, twice as many candidates are kept in flight
+        :param max_age: tells after which a pending result is a straggler
+        """
+        self.max_age = max_age
+        self._workers = workers
+        _, obj_func = evaluator.split_objective(objective_function)
+        self._executor = ProcessPoolExecutor(workers, mp_context=mp.get_context('fork'),
+                                             initializer=evaluator._init_worker,
+                                             initargs=(pickle.dumps(obj_func),))
+        self.late = 0
+        self.best = (None, np.inf)
+
+    def _record(self, x, f: float):
+        if f < self.best[1]:
+            self.best = (x, f)
+
+    def run(self, es, generations: int, prepare: callable, score: callable):
+        """
+        drive es for `generations` tells
+        :param prepare: candidate -> objective input, None for an infeasible candidate
+        :param score: objective value (None for an infeasible candidate) -> fitness, minimized
+        """
+        pending = collections.deque()
+        in_flight = {}
+        results = []
+        told = 0
+        capacity = self._workers * 2
+        try:
+            while told < generations:
+                # infeasible candidates don't occupy a worker, stop filling once a generation can be told
+                while len(in_flight) < capacity and len(results) < es.popsize:
+                    if not pending:
+                        solutions = es.ask()
+                        pending.extend((x, told) for x in solutions)
+                    x, asked = pending.popleft()
+                    arg = prepare(x)
+                    if arg is None:
+                        results.append((x, score(None)))
+                        continue
+                    in_flight[self._executor.submit(evaluator._worker_evaluate, arg)] = (x, asked)
+                done = wait(in_flight, return_when=FIRST_COMPLETED)[0] if len(results) < es.popsize else ()
+                for future in done:
+                    x, asked = in_flight.pop(future)
+                    f = score(future.result())
+                    self._record(x, f)
+                    if told - asked > self.max_age:
+                        self._late_result(es, x, f)
+                    else:
+                        results.append((x, f))
+                while len(results) >= es.popsize and told < generations:
+                    batch, results = results[:es.popsize], results[es.popsize:]
+                    es.tell([x for x, _ in batch], [f for _, f in batch])
+                    es.disp()
+                    told += 1
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+    def _late_result(self, es, x, f: float):
+        self.late += 1
+        if f <= self.best[1]:
+            # still the best candidate known, the next ask samples it again
+            es.inject([x], force=True)
+
+    def close(self):
+        self._executor.shutdown(cancel_futures=True)
+        if self.late:
+            print("steady-state: {} late results not told".format(self.late), file=sys.stderr)
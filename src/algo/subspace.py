@@ -0,0 +1,77 @@
+import numpy as np
+import src.utils.config as config
+
+"""
+Random-subspace search for long inputs.
+The strategies optimize k coordinates of the input at a time, the others stay frozen at a base
+vector (a seed, later the best vector found), so a strategy update costs the same whatever the
+seed length and most of the input is left intact. After each rotation the best vector of the
+finished subspace becomes the base and the next k coordinates are picked:
+- window: the next contiguous window, wrapping around the input
+- guided: sampled by credit, coordinates whose changes brought divergence or coverage gains are
+  picked more often, windows without gain less often
+"""
+
+# credit multiplier of coordinates which brought a gain, and of windows which did not
+CREDIT_UP = 2.0
+CREDIT_DOWN = 0.5
+CREDIT_MIN, CREDIT_MAX = 0.05, 20.0
+
+class Subspace:
+    def __init__(self, dim: int, k: int, base: np.ndarray, policy: str = 'window'):
+        self.dim = dim
+        self.k = min(k, dim)
+        self.policy = policy
+        self.base = np.asarray(base, dtype=float).copy()
+        self._offset = 0
+        self._credit = np.ones(dim)
+        self.rotations = 0
+        self.indices = self._pick()
+
+    def _pick(self) -> np.ndarray:
+        if self.policy == 'guided':
+            p = self._credit / self._credit.sum()
+            return np.sort(np.random.choice(self.dim, self.k, replace=False, p=p))
+        return np.sort((self._offset + np.arange(self.k)) % self.dim)
+
+    def project(self, xs) -> np.ndarray:
+        """
+        subspace coordinates of full vectors, shape (n, dim) -> (n, k) or (dim,) -> (k,)
+        """
+        return np.asarray(xs, dtype=float)[..., self.indices]
+
+    def embed(self, xs) -> np.ndarray:
+        """
+        full vectors of subspace candidates, shape (n, k) -> (n, dim)
+        """
+        xs = np.asarray(xs, dtype=float)
+        full = np.repeat(self.base[np.newaxis, :], len(xs), axis=0)
+        full[:, self.indices] = xs
+        return full
+
+    def rotate(self, best: np.ndarray, gain: float):
+        """
+        freeze the best vector of the current subspace as base and move to the next subspace
+        :param gain: improvement the search of the current subspace brought, > 0 for a gain,
+                     None when there is no baseline to measure it, the credit is left as is
+        """
+        best = np.asarray(best, dtype=float)
+        if gain is not None:
+            if gain > 0:
+                changed = self.indices[best[self.indices] != self.base[self.indices]]
+                self._credit[changed] *= CREDIT_UP
+            else:
+                self._credit[self.indices] *= CREDIT_DOWN
+            np.clip(self._credit, CREDIT_MIN, CREDIT_MAX, out=self._credit)
+        self.base = best.copy()
+        self._offset = (self._offset + self.k) % self.dim
+        self.indices = self._pick()
+        self.rotations += 1
+
+def make(dim: int, seeds: np.ndarray) -> Subspace:
+    """
+    subspace of a search of dimension dim per config, None when the whole input is searched
+    """
+    if config.subspace <= 0 or dim <= config.subspace:
+        return None
+    return Subspace(dim, config.subspace, seeds[np.random.randint(len(seeds))], config.subspace_policy)
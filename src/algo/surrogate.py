@@ -0,0 +1,113 @@
+import sys
+import math
+import numpy as np
+from sklearn.neighbors import KNeighborsRegressor
+
+"""
+Surrogate pre-screening of a generation.
+A kNN regressor trained online on the evaluation history (standardized candidates -> |diff| and
+coverage) ranks the candidates of each generation. Only the top `keep` fraction and a random
+`explore` fraction of the rest are executed. The others get a conservative value: no divergence
+(diff 0), the predicted coverage as tiebreak, so a prediction never becomes the best individual
+nor counts as a divergence.
+Campaigns evaluate several dimension groups with one evaluator, there is one surrogate per
+input dimension.
+"""
+
+# evaluations before the surrogate starts screening
+MIN_HISTORY = 64
+# most recent evaluations kept for training
+MAX_HISTORY = 20000
+
+class Surrogate:
+    def __init__(self, n_neighbors: int = 5):
+        self._model = KNeighborsRegressor(n_neighbors=n_neighbors, weights='distance')
+        self._xs = []
+        self._ys = []
+        self._size = 0
+        self._mean = None
+        self._scale = None
+
+    @property
+    def ready(self) -> bool:
+        return self._size >= MIN_HISTORY
+
+    def add(self, xs: np.ndarray, ys: np.ndarray):
+        """
+        :param ys: shape (n, 2), |diff| and coverage of each executed candidate
+        """
+        self._xs.append(np.asarray(xs, dtype=np.float64))
+        self._ys.append(np.asarray(ys, dtype=np.float64))
+        self._size += len(xs)
+        if self._size > MAX_HISTORY:
+            x = np.concatenate(self._xs)[-MAX_HISTORY:]
+            y = np.concatenate(self._ys)[-MAX_HISTORY:]
+            self._xs, self._ys, self._size = [x], [y], len(x)
+
+    def fit(self):
+        x = np.concatenate(self._xs)
+        self._mean = x.mean(axis=0)
+        # constant dimensions don't count in the distances
+        self._scale = np.where(x.std(axis=0) > 0, x.std(axis=0), np.inf)
+        self._model.fit((x - self._mean) / self._scale, np.concatenate(self._ys))
+
+    def predict(self, xs: np.ndarray) -> np.ndarray:
+        return self._model.predict((np.asarray(xs, dtype=np.float64) - self._mean) / self._scale)
+
+class ScreeningEvaluator:
+    def __init__(self, inner, keep: float, explore: float):
+        """
+        :param inner: evaluator executing the selected candidates
+        :param keep: fraction of the generation executed as most promising
+        :param explore: fraction of the remaining candidates executed at random
+        """
+        self._inner = inner
+        self._keep = keep
+        self._explore = explore
+        # input dimension -> surrogate
+        self._surrogates = {}
+        self.executed = 0
+        self.saved = 0
+        # indices of the candidates executed by the last evaluate(), the others are predictions
+        self.last_executed = np.arange(0)
+
+    def _select(self, predicted: np.ndarray) -> np.ndarray:
+        n = len(predicted)
+        # most promising first: predicted |diff|, then predicted coverage
+        order = np.lexsort((-predicted[:, 1], -predicted[:, 0]))
+        top = order[:max(1, math.ceil(self._keep * n))]
+        rest = order[len(top):]
+        explore = np.random.choice(rest, min(len(rest), math.ceil(self._explore * len(rest))), replace=False)
+        return np.sort(np.concatenate([top, explore]).astype(int))
+
+    def evaluate(self, xs: np.ndarray) -> list:
+        surrogate = self._surrogates.setdefault(xs.shape[1], Surrogate())
+        if not surrogate.ready:
+            values = self._inner.evaluate(xs)
+            self._learn(xs, values)
+            self.executed += len(xs)
+            self.last_executed = np.arange(len(xs))
+            return values
+        surrogate.fit()
+        predicted = surrogate.predict(xs)
+        chosen = self._select(predicted)
+        executed = self._inner.evaluate(xs[chosen])
+        self._learn(xs[chosen], executed)
+        # skipped candidates: no divergence, predicted coverage (unknown with novelty maps)
+        novelty = any(isinstance(c_cov, (bytes, bytearray)) for _, c_cov in executed)
+        values = [(0.0, None if novelty else float(c)) for _, c in predicted]
+        for i, value in zip(chosen, executed):
+            values[i] = value
+        self.last_executed = chosen
+        self.executed += len(chosen)
+        self.saved += len(xs) - len(chosen)
+        print("surrogate: executed {}/{}, saved {} executions ({} saved in total)".format(
+            len(chosen), len(xs), len(xs) - len(chosen), self.saved), file=sys.stderr)
+        return values
+
+    def _learn(self, xs: np.ndarray, values: list):
+        ys = [(abs(diff), c_cov if isinstance(c_cov, (int, float)) else 0.0) for diff, c_cov in values]
+        self._surrogates[xs.shape[1]].add(xs, ys)
+
+    def close(self):
+        self._inner.close()
@@ -0,0 +1,75 @@
+import time
+import asyncio
+import src.utils.config as config
+import src.diff_oracle.handler as handler
+import src.diff_oracle.timing as timing
+import src.diff_oracle.capture as capture
+
+async def _drain(stream: asyncio.StreamReader, sink: capture.StreamCapture):
+    while True:
+        chunk = await stream.read(1 << 16)
+        if not chunk:
+            return
+        sink.feed(chunk)
+
+async def _feed(stream: asyncio.StreamWriter, data: bytes):
+    try:
+        stream.write(data)
+        await stream.drain()
+    except (BrokenPipeError, ConnectionResetError):
+        # the program does not read all of its input
+        pass
+    stream.close()
+
+async def run_program(argv: list, stdin_data: bytes = None, timeout: float = 10, cwd: str = None,
+                      env: dict = None, check: bool = False) -> (bytes, bytes, int, bytes):
+    """
+    asyncio counterpart of Handler.execute_program_subprocess_*
+    return (stdout, stderr, exit_code, stdout digest), outputs are capped at config.output_cap like Handler
+    check: mimic subprocess.run(check=True) like the args mode of Handler
+    """
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *argv,
+            stdin=asyncio.subprocess.PIPE if stdin_data is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=cwd,
+            env=env
+        )
+    except Exception as e:
+        return b"", str(e).encode('utf-8', errors='replace'), -1, None
+    out = capture.StreamCapture(config.output_cap)
+    err = capture.StreamCapture(config.output_cap)
+    io = [_drain(proc.stdout, out), _drain(proc.stderr, err)]
+    if stdin_data is not None:
+        io.append(_feed(proc.stdin, stdin_data))
+    try:
+        await asyncio.wait_for(asyncio.gather(*io, proc.wait()), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        return b"", handler.TIMEOUT_ERROR, -1, None
+    exit_code = handler.exit_code_of(proc.returncode)
+    if check and exit_code != 0:
+        return b"", handler.called_process_error(argv, proc.returncode), -1, None
+    return out.value(), err.value(), exit_code, out.digest()
+
+async def run_handler(h: handler.Handler, args_buffer: bytes, stdin_data: bytes = None, cwd: str = None,
+                      env: dict = None) -> (bytes, bytes, int, bytes):
+    """
+    run_program with the command, timeout, hang cache and statistics of a handler
+    stdin_data None means args mode
+    """
+    key = timing.HangCache.key(args_buffer, stdin_data)
+    if key in h.hangs:
+        h.stats.hang_hits += 1
+        return b"", handler.TIMEOUT_ERROR, -1, None
+    start = time.perf_counter()
+    stdout, stderr, exit_code, digest = await run_program(h.exec_argv + args_buffer.split(), stdin_data, h.timeout,
+                                                          cwd, env, check=stdin_data is None)
+    timed_out = exit_code == -1 and stderr == handler.TIMEOUT_ERROR
+    h.stats.record(time.perf_counter() - start, timed_out)
+    if timed_out:
+        h.hangs.add(key)
+    return stdout, stderr, exit_code, digest
@@ -3,10 +3,13 @@ import sys
 import numpy as np
 import src.utils.constant as constant
 import src.utils.type as type
+import src.utils.divergence_log as divergence_log
 from numba import jit
-from datetime import datetime
 from rapidfuzz.distance import Levenshtein as RFLevenshtein
 
+# numba freezes module globals at compile time
+_NAN_MISMATCH_DIFF = constant.Constant.STR_MISMATCH_DIFF
+
 class Compare:
     @staticmethod
     def try_parse_number(s):
@@ -28,19 +31,20 @@ class Compare:
         """
         compute edit distance between s1, s2
         """
-        m, n = len(s1), len(s2)
-        dp = [[0] * (n + 1) for _ in range(m + 1)]
-        for i in range(m + 1):
-            dp[i][0] = i
-        for j in range(n + 1):
-            dp[0][j] = j
-        for i in range(1, m + 1):
-            for j in range(1, n + 1):
-                cost = 0 if s1[i-1] == s2[j-1] else 1
-                dp[i][j] = min(dp[i-1][j] + 1,
-                               dp[i][j-1] + 1,
-                               dp[i-1][j-1] + cost)
-        return dp[m][n]
+        return RFLevenshtein.distance(s1, s2)
+
+    @staticmethod
+    def to_numeric(values) -> np.ndarray:
+        """
+        float64 array of a parsed list or of its tokens, None when an element is not a number
+        """
+        if isinstance(values, np.ndarray) and values.dtype.kind in 'iuf':
+            return values.astype(np.float64, copy=False)
+        try:
+            array = np.array(values, dtype=np.float64)
+        except (ValueError, TypeError, OverflowError):
+            return None
+        return array if array.ndim == 1 else None
 
     @staticmethod
     def element_level_diff(s1, s2):
@@ -84,6 +88,10 @@ class Compare:
         if len(list1) > 1 or len(list2) > 1:
             if len(list1) != len(list2):
                 return constant.Constant.LIST_LENGTH_MISMATCH_DIFF * abs(len(list1) - len(list2))
+            array1 = Compare.to_numeric(list1)
+            array2 = Compare.to_numeric(list2)
+            if array1 is not None and array2 is not None:
+                return Compare.numba_diff_float(array1, array2)
             diff = 0.0
             for elem1, elem2 in zip(list1, list2):
                 diff += Compare.element_level_diff(elem1, elem2)
@@ -92,8 +100,30 @@ class Compare:
 
     @staticmethod
     def diff_float(n1: float, n2: float) -> float:
+        # same rule as numba_diff_float, in plain python: a kernel call costs more than one scalar
+        if n1 == n2:
+            return 0.0
+        if n1 != n1 or n2 != n2:
+            return 0.0 if n1 != n1 and n2 != n2 else _NAN_MISMATCH_DIFF
         return abs(n1 - n2)
 
+    @staticmethod
+    def diff_values(list1, list2) -> float:
+        """
+        diff of two parsed lists (python lists or numpy arrays)
+        all-numeric lists go through the numba kernel, others through the edit distance of each element
+        """
+        if len(list1) != len(list2):
+            return constant.Constant.LIST_LENGTH_MISMATCH_DIFF * abs(len(list1) - len(list2))
+        array1 = Compare.to_numeric(list1)
+        array2 = Compare.to_numeric(list2) if array1 is not None else None
+        if array2 is not None:
+            return Compare.numba_diff_float(array1, array2)
+        res_diff = 0.0
+        for e1, e2 in zip(list1, list2):
+            res_diff += RFLevenshtein.distance(str(e1), str(e2))
+        return float(res_diff)
+
     @staticmethod
     def diff_list(list1: list, list2: list, ele_type: type.ResultType) -> float:
         # first compare the length
@@ -114,10 +144,19 @@ class Compare:
     def numba_diff_float(list1: np.ndarray, list2: np.ndarray) -> float:
         """
         use numba for acceleration
+        sum of |a - b|, NaN matches NaN only, NaN against a number counts as a mismatch
         """
         res_diff = 0.0
         for i in range(len(list1)):
-            res_diff += abs(list1[i] - list2[i])
+            a = list1[i]
+            b = list2[i]
+            if a == b:
+                continue
+            if a != a or b != b:
+                if not (a != a and b != b):
+                    res_diff += _NAN_MISMATCH_DIFF
+            else:
+                res_diff += abs(a - b)
         return res_diff
 
     @staticmethod
@@ -129,8 +168,8 @@ class Compare:
             return constant.Constant.LIST_LENGTH_MISMATCH_DIFF * abs(len(list1) - len(list2))
 
         if ele_type == type.ResultType.FLOAT or ele_type == type.ResultType.INTEGER:
-            array1 = np.array(list1, dtype=np.float64)
-            array2 = np.array(list2, dtype=np.float64)
+            array1 = np.asarray(list1, dtype=np.float64)
+            array2 = np.asarray(list2, dtype=np.float64)
             return Compare.numba_diff_float(array1, array2)
 
         elif ele_type == type.ResultType.STRING:
@@ -142,39 +181,8 @@ class Compare:
         return 0.0
 
     @staticmethod
-    def log_divergence(input_data, out1, out2, err1, err2, diff):
-        try:
-            with open("divergence.log", "ab") as logfile:
-                logfile.write(b"======= DIVERGENCE DETECTED =======\n")
-                logfile.write(b"[Input Data]: \n")
-                if isinstance(input_data, bytes):
-                    logfile.write(input_data)
-                else:
-                    logfile.write(input_data.encode('utf-8', errors='replace'))
-                logfile.write(b"\n\n[C Program Stdout]:\n")
-                if isinstance(out1, bytes):
-                    logfile.write(out1)
-                else:
-                    logfile.write(out1.encode('utf-8', errors='replace'))
-                logfile.write(b"\n\n[C Program Stderr]:\n")
-                if isinstance(err1, bytes):
-                    logfile.write(err1)
-                else:
-                    logfile.write(err1.encode('utf-8', errors='replace'))
-                logfile.write(b"\n\n[Rust Program Stdout]:\n")
-                if isinstance(out2, bytes):
-                    logfile.write(out2)
-                else:
-                    logfile.write(out2.encode('utf-8', errors='replace'))
-                logfile.write(b"\n\n[Rust Program Stderr]:\n")
-                if isinstance(err2, bytes):
-                    logfile.write(err2)
-                else:
-                    logfile.write(err2.encode('utf-8', errors='replace'))
-                logfile.write(b"\nDifference Score: " + str(diff).encode('utf-8') + b"\n\n")
-                current_time = datetime.now().strftime("%a %b %d %H:%M:%S %Y")
-                logfile.write(b"\n[Time Detected]: " + current_time.encode('utf-8') + b"\n")
-        except Exception as e:
-            print("Error: Failed to open divergence.log for writing!", file=sys.stderr)
-            return
-        print("!! Found divergence case (diff={}), details logged to divergence.log".format(diff), file=sys.stderr)
\ No newline at end of file
+    def log_divergence(input_data, out1, out2, err1, err2, diff, bucket: int = None):
+        """
+        :param bucket: signature of the divergence bucket (bucketing.signature), if bucketed
+        """
+        divergence_log.get_log().write(input_data, out1, out2, err1, err2, diff, bucket)
@@ -0,0 +1,80 @@
+import sys
+import hashlib
+import src.utils.result as res
+
+"""
+Divergence bucketing.
+Divergences found while the search keeps exploring one divergent region are nearly identical,
+they share a signature: kind of mismatch, result types, exit codes and size class of the outputs
+(element counts on a log2 scale). The C coverage hash is an optional finer key (--bucket-coverage).
+Only the first `keep` divergences of a bucket are logged, afterwards only an input shorter than
+the smallest one seen so far.
+"""
+
+def _size(ret: res.DetectionResult) -> int:
+    if ret.result_type == res.ResultType.LIST:
+        return len(ret.parsed_value)
+    return len(ret.original_value)
+
+def signature(kind: str, c_ret: res.DetectionResult, r_ret: res.DetectionResult) -> int:
+    """
+    64-bit bucket signature of a divergence, the C coverage hash is part of it when the result has one
+    """
+    key = "{}|{}|{}|{}|{}|{}|{}".format(
+        kind, c_ret.result_type.name, r_ret.result_type.name, c_ret.exit_code, r_ret.exit_code,
+        _size(c_ret).bit_length(), _size(r_ret).bit_length())
+    h = hashlib.blake2b(key.encode('utf-8'), digest_size=8)
+    if c_ret.cov_hash is not None:
+        h.update(c_ret.cov_hash)
+    return int.from_bytes(h.digest(), 'little')
+
+class DivergenceBuckets:
+    def __init__(self, keep: int):
+        """
+        :param keep: divergences logged per bucket before only smaller inputs are
+        """
+        self.keep = keep
+        # signature -> [divergences seen, logged, smallest input]
+        self._index = {}
+        self.suppressed = 0
+
+    def admit(self, sig: int, x: bytes) -> bool:
+        """
+        count a divergence, True when it is to be logged
+        """
+        bucket = self._index.get(sig)
+        if bucket is None:
+            self._index[sig] = [1, 1, x]
+            return True
+        bucket[0] += 1
+        if bucket[1] < self.keep or len(x) < len(bucket[2]):
+            bucket[1] += 1
+            if len(x) < len(bucket[2]):
+                bucket[2] = x
+            return True
+        self.suppressed += 1
+        return False
+
+    def count(self, sig: int) -> int:
+        bucket = self._index.get(sig)
+        return bucket[0] if bucket is not None else 0
+
+    def smallest(self) -> dict:
+        """
+        signature -> smallest input of every bucket
+        """
+        return {sig: bucket[2] for sig, bucket in self._index.items()}
+
+    def __len__(self):
+        return len(self._index)
+
+    def report(self, top: int = 10):
+        if not self._index:
+            return
+        total = sum(bucket[0] for bucket in self._index.values())
+        print("divergences: {} in {} buckets, {} not logged".format(total, len(self._index), self.suppressed),
+              file=sys.stderr)
+        ranked = sorted(self._index.items(), key=lambda item: item[1][0], reverse=True)
+        for sig, (seen, logged, smallest) in ranked[:top]:
+            print("  bucket {:016x}: {} seen, {} logged, smallest input {} bytes".format(
+                sig, seen, logged, len(smallest)), file=sys.stderr)
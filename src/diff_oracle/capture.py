@@ -0,0 +1,66 @@
+import hashlib
+
+# appended to a capped output when it is logged, never to the bytes which are parsed
+TRUNCATION_MARKER = "\n[... output truncated]"
+
+class StreamCapture:
+    """
+    Bounded capture of one output stream.
+    Keeps the first `cap` bytes and hashes all of them (blake2b, updated chunk by chunk), so two
+    truncated outputs are still told apart exactly by digest().
+    """
+    def __init__(self, cap: int):
+        self.cap = cap
+        self.size = 0
+        self._chunks = []
+        self._kept = 0
+        self._hash = hashlib.blake2b(digest_size=16)
+
+    def feed(self, chunk: bytes):
+        self.size += len(chunk)
+        self._hash.update(chunk)
+        if self._kept < self.cap:
+            kept = chunk[:self.cap - self._kept]
+            self._chunks.append(kept)
+            self._kept += len(kept)
+
+    @property
+    def truncated(self) -> bool:
+        return self.size > self.cap
+
+    def digest(self) -> bytes:
+        """
+        digest of the whole stream when it was truncated, None otherwise (the bytes are exact)
+        """
+        return self._hash.digest() if self.truncated else None
+
+    def value(self) -> bytes:
+        """
+        the kept bytes, the first `cap` of the stream
+        """
+        return b"".join(self._chunks)
+
+def marked(text: str, truncated: bool) -> str:
+    """
+    output text for the divergence log, flagged when the capture cut it
+    """
+    return text + TRUNCATION_MARKER if truncated else text
+
+def capture(data: bytes, cap: int) -> StreamCapture:
+    """
+    capture of an output which is already in memory
+    """
+    c = StreamCapture(cap)
+    c.feed(data)
+    return c
+
+def capture_file(f, cap: int, block: int = 1 << 16) -> StreamCapture:
+    """
+    capture of an output written to a file, read from the current position
+    """
+    c = StreamCapture(cap)
+    while True:
+        chunk = f.read(block)
+        if not chunk:
+            return c
+        c.feed(chunk)
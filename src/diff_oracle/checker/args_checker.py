@@ -8,18 +8,18 @@ class Args_Checker(base_checker.Base_Checker):
         self.r_handler = r_handler
 
     def C(self, x: bytes) -> res.DetectionResult:
+        base_checker._reset_cov()
         self.c_handler.execute_program_subprocess_args(x)
         cov = base_checker._read_cov()
-        c_result = self.c_handler.get_result().decode('utf-8', errors='ignore')
-        c_error = self.c_handler.get_error().decode('utf-8', errors='ignore')
-        if c_error or self.c_handler.get_exit_code() != 0:
-            return res.construct_error(c_result, c_error, self.c_handler.get_exit_code())
-        return res.parse_result(c_result.strip(), cov)
+        return base_checker._handler_result(self.c_handler, cov, base_checker._read_cov_bits(),
+                                            base_checker._read_cov_hash())
 
-    def R(self, x: bytes) -> res.DetectionResult:
-        self.r_handler.execute_program_subprocess_args(x)
-        r_result = self.r_handler.get_result().decode('utf-8', errors='ignore')
-        r_error = self.r_handler.get_error().decode('utf-8', errors='ignore')
-        if r_error or self.r_handler.get_exit_code() != 0:
-            return res.construct_error(r_result, r_error, self.r_handler.get_exit_code())
-        return res.parse_result(r_result.strip())
\ No newline at end of file
+    def R(self, x: bytes, expected: res.DetectionResult = None) -> res.DetectionResult:
+        if base_checker._streams(expected):
+            self.r_handler.execute_program_streaming(x, None, expected)
+        else:
+            self.r_handler.execute_program_subprocess_args(x)
+        return base_checker._handler_result(self.r_handler)
+
+    def exec_spec(self, x: bytes) -> (bytes, bytes):
+        return x, None
\ No newline at end of file
@@ -1,5 +1,6 @@
 import os
-import fcntl
+import asyncio
+import hashlib
 from abc import ABC, abstractmethod
 from functools import lru_cache
 import numpy as np
@@ -8,52 +9,214 @@ import src.utils.constant as constant
 import src.utils.config as config
 import src.utils.byte_converter as byte_converter
 import src.diff_oracle.basic_compare as compare
+import src.diff_oracle.sandbox as sandbox
+import src.diff_oracle.coverage as coverage
+import src.diff_oracle.async_exec as async_exec
+import src.diff_oracle.bucketing as bucketing
+import src.diff_oracle.capture as capture
 
-def _read_cov():
-    filepath = config.cov_temp
-    if not os.path.exists(filepath):
-        return -1.0
-    try:
-        with open(filepath, "r") as f:
-            fcntl.flock(f, fcntl.LOCK_EX)
-            coverage = float(f.readline().strip())  # Convert the coverage string to float
-            fcntl.flock(f, fcntl.LOCK_UN)
-            return coverage
-    except (ValueError, IOError) as e:
-        print(f"Error reading coverage file: {e}")
-        return -1.0
+def _reset_cov(cov_map: coverage.CoverageMap = None):
+    """
+    clear the coverage map before running the C program
+    """
+    (cov_map or coverage.get_map()).reset()
+
+def _read_cov(cov_map: coverage.CoverageMap = None) -> float:
+    """
+    C code coverage percentage of the last run, -1.0 if nothing was recorded
+    """
+    return (cov_map or coverage.get_map()).percent()
+
+def _read_cov_map(cov_map: coverage.CoverageMap = None) -> np.ndarray:
+    """
+    raw edge hit map of the last run (zero-copy view, copy it to keep it)
+    """
+    return (cov_map or coverage.get_map()).hits()
+
+def _read_cov_bits(cov_map: coverage.CoverageMap = None) -> bytes:
+    """
+    packed hit map of the last run when the novelty objective is on, else None
+    """
+    if not config.cov_novelty:
+        return None
+    return np.packbits((cov_map or coverage.get_map()).hits() != 0).tobytes()
+
+def _read_cov_hash(cov_map: coverage.CoverageMap = None) -> bytes:
+    """
+    hash of the edges hit by the last run when divergences are bucketed by coverage, else None
+    """
+    if config.divergence_buckets <= 0 or not config.bucket_coverage:
+        return None
+    hits = (cov_map or coverage.get_map()).hits()
+    if not hits.size:
+        return None
+    return hashlib.blake2b(np.packbits(hits != 0).tobytes(), digest_size=8).digest()
+
+def to_result(stdout: bytes, stderr: bytes, exit_code: int, cov: float = -1.0,
+              cov_bits: bytes = None, digest: bytes = None, cov_hash: bytes = None) -> res.DetectionResult:
+    """
+    turn the raw output of one execution into a DetectionResult, each stream is decoded once
+    :param digest: digest of the whole stdout when the capture cut it
+    """
+    result = stdout.decode('utf-8', errors='ignore')
+    error = stderr.decode('utf-8', errors='ignore') if stderr else ""
+    if error or exit_code != 0:
+        return res.construct_error(result, error, exit_code)
+    ret = res.parse_result(result.strip(), cov)
+    ret.cov_map = cov_bits
+    ret.digest = digest
+    ret.cov_hash = cov_hash
+    return ret
+
+# stderr noted in the divergence log for a Rust run killed by the streaming comparison
+STREAM_ABORT_NOTE = "[output cut, killed after a certain divergence]"
+
+def _streams(expected: res.DetectionResult) -> bool:
+    """
+    whether the Rust run is compared on the fly against this C result
+    """
+    return (config.stream_compare and expected is not None
+            and expected.result_type != res.ResultType.ERROR and expected.exit_code == 0)
+
+def _handler_result(h, cov: float = -1.0, cov_bits: bytes = None, cov_hash: bytes = None) -> res.DetectionResult:
+    """
+    DetectionResult of the last execution of a handler
+    """
+    if h.aborted:
+        # a fixed divergence, the prefix read is not parsed like a complete output
+        return res.DetectionResult(res.ResultType.STRING, h.get_result().decode('utf-8', errors='ignore'),
+                                   STREAM_ABORT_NOTE, 0, cov=cov, aborted=True)
+    return to_result(h.get_result(), h.get_error(), h.get_exit_code(), cov, cov_bits, h.result_digest, cov_hash)
+
+def encode_int_step(x: np.ndarray) -> bytes:
+    # transfer ndarray to string, separate by ' ' , then encode as bytes
+    x_int = np.round(x).astype(int)
+    return b' '.join(map(lambda i: str(i).encode('utf-8'), x_int))  # e.g,: b'1 2 3'
+
+def encode_unicode(x: np.ndarray) -> bytes:
+    char_list = [chr(int(round(code))) for code in x]
+    return b' '.join(map(lambda c: c.encode('utf-8'), char_list))
+
+def encode_byte_step(x: np.ndarray) -> bytes:
+    return byte_converter.int_numpy_to_bytes(x)
+
+# whole (n, dim) generation -> program inputs, by objective name, same bytes as the encoders above
+BATCH_ENCODERS = {
+    'int_step_objective': byte_converter.int_rows_to_ascii,
+    'unicode_objective': byte_converter.codepoints_to_utf8,
+    'byte_step_objective': byte_converter.int_rows_to_bytes,
+}
 
 class Base_Checker(ABC):
+    # persistent evaluation cache (eval_store.EvalStore), replaces the in-memory lru cache when set
+    eval_store = None
+    # divergence buckets of this process (bucketing.DivergenceBuckets), created on the first divergence
+    buckets = None
+
     @abstractmethod
     def C(self, x: bytes) -> res.DetectionResult:
         pass
 
     @abstractmethod
-    def R(self, x: bytes) -> res.DetectionResult:
+    def R(self, x: bytes, expected: res.DetectionResult = None) -> res.DetectionResult:
+        """
+        :param expected: C result of x, the Rust output is streamed against it when config.stream_compare is on
+        """
+        pass
+
+    @abstractmethod
+    def exec_spec(self, x: bytes) -> (bytes, bytes):
+        """
+        how x is passed to both programs: (args buffer, stdin data or None)
+        """
         pass
 
     # objective function, return (-abs(diff), c code coverage)
+    # with the novelty objective the coverage is the packed hit map instead of the percentage
     def F(self, x: bytes) -> (float, float):
         c_ret = self.C(x)
-        r_ret = self.R(x)
-        c_cov = c_ret.cov
+        return self.compare(x, c_ret, self.R(x, c_ret))
+
+    async def _F_async(self, x: bytes, slots: asyncio.Queue) -> (float, float):
+        args_buffer, stdin_data = self.exec_spec(x)
+        slot = await slots.get()
+        try:
+            c_dir, r_dir, cov_map = slot
+            # per-slot coverage map
+            _reset_cov(cov_map)
+            env = dict(os.environ)
+            env.update(cov_map.env())
+            # both implementations of the same input run concurrently
+            (c_out, c_err, c_code, c_digest), (r_out, r_err, r_code, r_digest) = await asyncio.gather(
+                async_exec.run_handler(self.c_handler, args_buffer, stdin_data, cwd=c_dir, env=env),
+                async_exec.run_handler(self.r_handler, args_buffer, stdin_data, cwd=r_dir)
+            )
+            cov = _read_cov(cov_map)
+            cov_bits = _read_cov_bits(cov_map)
+            cov_hash = _read_cov_hash(cov_map)
+            sandbox.SandboxPool.wipe(c_dir)
+            sandbox.SandboxPool.wipe(r_dir)
+        finally:
+            slots.put_nowait(slot)
+        c_ret = to_result(c_out, c_err, c_code, cov, cov_bits, c_digest, cov_hash)
+        r_ret = to_result(r_out, r_err, r_code, digest=r_digest)
+        value = self.compare(x, c_ret, r_ret)
+        if self.eval_store is not None:
+            self.eval_store.put(x, value, c_ret, r_ret)
+        return value
+
+    async def F_batch(self, xs: list[bytes], concurrency: int = 16) -> list:
+        """
+        evaluate a whole generation with at most `concurrency` candidates in flight,
+        return the objective values in input order
+        """
+        pool = sandbox.get_pool()
+        slots = asyncio.Queue()
+        for _ in range(concurrency):
+            slots.put_nowait((pool.acquire(), pool.acquire(), coverage.CoverageMap()))
+        by_input = {}
+        if self.eval_store is not None:
+            for x in dict.fromkeys(xs):
+                value = self.eval_store.get(x)
+                if value is not None:
+                    by_input[x] = value
+        unique = [x for x in dict.fromkeys(xs) if x not in by_input]
+        try:
+            values = await asyncio.gather(*(self._F_async(x, slots) for x in unique))
+        finally:
+            while not slots.empty():
+                c_dir, r_dir, cov_map = slots.get_nowait()
+                pool.release(c_dir)
+                pool.release(r_dir)
+                cov_map.close()
+        by_input.update(zip(unique, values))
+        return [by_input[x] for x in xs]
+
+    def compare(self, x: bytes, c_ret: res.DetectionResult, r_ret: res.DetectionResult) -> (float, float):
+        c_cov = c_ret.cov if c_ret.cov_map is None else c_ret.cov_map
+        kind, res_diff = self.mismatch(c_ret, r_ret)
+        if kind is not None:
+            # found a divergence case, log it
+            self.log_divergence(kind, x, c_ret, r_ret, res_diff)
+        return -abs(res_diff), c_cov
+
+    def mismatch(self, c_ret: res.DetectionResult, r_ret: res.DetectionResult) -> (str, float):
+        """
+        kind of mismatch of two results and its diff, kind is None when they don't diverge
+        """
         res_diff = 0.0
         # omit the testcase which trigger C Asan error
         if c_ret.result_type == res.ResultType.ERROR or c_ret.exit_code == -1:
-            return 0.0, c_cov
+            return None, 0.0
+        if r_ret.aborted:
+            # the streaming comparison already saw a certain divergence
+            return 'stream', constant.Constant.STREAM_MISMATCH_DIFF
         if c_ret.result_type != r_ret.result_type:
-            # found a divergence case, log it
-            compare.Compare.log_divergence(x, c_ret.original_value, r_ret.original_value, c_ret.stderr, r_ret.stderr,
-                                           constant.Constant.TYPE_MISMATCH_DIFF)
-            return -constant.Constant.TYPE_MISMATCH_DIFF, c_cov
+            return 'type', constant.Constant.TYPE_MISMATCH_DIFF
         # handle the case by type
         if c_ret.result_type == res.ResultType.LIST:
-            c_res = list(c_ret.parsed_value)
-            r_res = list(r_ret.parsed_value)
-            if isinstance(c_res[0], int):
-                res_diff = compare.Compare.numba_diff_list(c_res, r_res, res.ResultType.INTEGER)
-            else:
-                res_diff = compare.Compare.numba_diff_list(c_res, r_res, res.ResultType.STRING)
+            # typed arrays from parse_result go to the numba kernel without conversion
+            res_diff = compare.Compare.diff_values(c_ret.parsed_value, r_ret.parsed_value)
         if c_ret.result_type in [res.ResultType.INTEGER, res.ResultType.FLOAT]:
             c_res = float(c_ret.original_value)
             r_res = float(r_ret.original_value)
@@ -64,29 +227,67 @@ class Base_Checker(ABC):
             # verify error pipe
             # if not (c_ret.stderr and r_ret.stderr):
             #     res_diff += constant.Constant.STDERR_MISMATCH
-        if res_diff > 0.0:
-            compare.Compare.log_divergence(x, c_ret.original_value, r_ret.original_value, c_ret.stderr, r_ret.stderr,
-                                           res_diff)
-        return -abs(res_diff), c_cov
+        kind = 'exit' if c_ret.result_type == res.ResultType.ERROR else 'value'
+        if res_diff == 0.0 and c_ret.digest != r_ret.digest:
+            # outputs cut at the capture cap, the kept prefixes match but the whole outputs do not
+            res_diff += constant.Constant.STR_MISMATCH_DIFF
+            kind = 'digest'
+        return (kind if res_diff > 0.0 else None), res_diff
+
+    def divergence_signature(self, x: bytes) -> int:
+        """
+        bucket signature of the divergence x triggers, None when it does not diverge; not logged
+        """
+        c_ret = self.C(x)
+        r_ret = self.R(x, c_ret)
+        kind, _ = self.mismatch(c_ret, r_ret)
+        return bucketing.signature(kind, c_ret, r_ret) if kind is not None else None
+
+    def log_divergence(self, kind: str, x: bytes, c_ret: res.DetectionResult, r_ret: res.DetectionResult,
+                       diff: float):
+        """
+        log a divergence unless its bucket already holds enough of them
+        :param kind: mismatch found by compare(): 'type', 'value', 'exit', 'digest' or 'stream'
+        """
+        sig = None
+        if config.divergence_buckets > 0:
+            if self.buckets is None:
+                self.buckets = bucketing.DivergenceBuckets(config.divergence_buckets)
+            sig = bucketing.signature(kind, c_ret, r_ret)
+            if not self.buckets.admit(sig, x):
+                return
+        # digest is only set for a stdout cut at the capture cap
+        compare.Compare.log_divergence(x, capture.marked(c_ret.original_value, c_ret.digest is not None),
+                                       capture.marked(r_ret.original_value, r_ret.digest is not None),
+                                       c_ret.stderr, r_ret.stderr, diff, sig)
+
+    def report_divergences(self):
+        if self.buckets is not None:
+            self.buckets.report()
 
-    @lru_cache(maxsize=1024)
     def cached_F(self, x: bytes) -> float:
+        if self.eval_store is None:
+            return self._lru_F(x)
+        value = self.eval_store.get(x)
+        if value is None:
+            c_ret = self.C(x)
+            r_ret = self.R(x, c_ret)
+            value = self.compare(x, c_ret, r_ret)
+            self.eval_store.put(x, value, c_ret, r_ret)
+        return value
+
+    @lru_cache(maxsize=1024)
+    def _lru_F(self, x: bytes) -> float:
         return self.F(x)
 
     def int_step_objective(self, x: np.ndarray) -> float:
-        # transfer ndarray to string, separate by ' ' , then encode as bytes
-        x_int = np.round(x).astype(int)
-        x_bytes = b' '.join(map(lambda i: str(i).encode('utf-8'), x_int))  # e.g,: b'1 2 3'
-        return self.cached_F(x_bytes)
+        return self.cached_F(encode_int_step(x))
 
     def unicode_objective(self, x: np.ndarray) -> float:
-        char_list = [chr(int(round(code))) for code in x]
-        x_bytes = b' '.join(map(lambda c: c.encode('utf-8'), char_list))
-        return self.cached_F(x_bytes)
+        return self.cached_F(encode_unicode(x))
 
     def byte_step_objective(self, x: np.array) -> float:
-        b = byte_converter.int_numpy_to_bytes(x)
-        return self.cached_F(b)
+        return self.cached_F(encode_byte_step(x))
 
     def proto_buf_objective(self, x: bytes) -> float:
         return self.cached_F(x)
\ No newline at end of file
@@ -0,0 +1,74 @@
+import os
+import itertools
+import numpy as np
+import multiprocessing.util as mp_util
+from multiprocessing import shared_memory
+
+# must match coverage_cb.c
+MAP_SIZE = 1 << 16
+HEADER_SIZE = 8
+SHM_ENV = 'C2RUST_SHM_NAME'
+
+_ids = itertools.count()
+
+class CoverageMap:
+    """
+    Edge coverage bitmap shared with the instrumented C program (coverage_cb.c).
+    Layout: uint32 magic, uint32 number of guards, then one byte per guard (index mod MAP_SIZE).
+    The program finds the segment through the C2RUST_SHM_NAME env var and sets the byte of
+    every guard it hits, python only views the segment through numpy, no file or lock involved.
+    """
+    def __init__(self):
+        name = 'c2rust_cov_{}_{}'.format(os.getpid(), next(_ids))
+        self._shm = shared_memory.SharedMemory(name=name, create=True, size=HEADER_SIZE + MAP_SIZE)
+        self._header = np.ndarray((2,), dtype=np.uint32, buffer=self._shm.buf)
+        self._bitmap = np.ndarray((MAP_SIZE,), dtype=np.uint8, buffer=self._shm.buf, offset=HEADER_SIZE)
+
+    @property
+    def shm_name(self) -> str:
+        return '/' + self._shm.name
+
+    def env(self) -> dict:
+        return {SHM_ENV: self.shm_name}
+
+    def reset(self):
+        self._header[:] = 0
+        self._bitmap[:] = 0
+
+    def total(self) -> int:
+        return int(self._header[1])
+
+    def hits(self) -> np.ndarray:
+        """
+        raw hit map of the last run, a view which is overwritten by the next run
+        """
+        return self._bitmap[:min(self.total(), MAP_SIZE)]
+
+    def percent(self) -> float:
+        """
+        percentage of guards hit by the last run, -1.0 when the program was not instrumented
+        """
+        total = self.total()
+        if total == 0:
+            return -1.0
+        return round(100.0 * np.count_nonzero(self.hits()) / total, 2)
+
+    def close(self):
+        del self._header, self._bitmap
+        self._shm.close()
+        self._shm.unlink()
+
+_map = None
+_map_pid = None
+
+def get_map() -> CoverageMap:
+    """
+    coverage map of the current process, exported to child processes through os.environ
+    """
+    global _map, _map_pid
+    if _map is None or _map_pid != os.getpid():
+        _map = CoverageMap()
+        _map_pid = os.getpid()
+        os.environ.update(_map.env())
+        mp_util.Finalize(None, _map.close, exitpriority=0)
+    return _map
@@ -0,0 +1,201 @@
+import os
+import sys
+import select
+import signal
+import struct
+import subprocess
+import src.utils.config as config
+import src.diff_oracle.handler as handler
+import src.diff_oracle.sandbox as sandbox
+import src.diff_oracle.capture as capture
+
+FORKSRV_FD = 198
+# seconds the target may take to start and reach the forkserver
+HANDSHAKE_TIMEOUT = 10
+# files shared with the forkserver inside its sandbox: stdin, stdout, stderr, arguments
+IO_FILES = ('.cur_input', '.stdout', '.stderr', '.cur_args')
+
+class ForkserverHandler(handler.Handler):
+    """
+    Handler backed by an AFL-style forkserver.
+    The target is started once with the forkserver shim preloaded, each execution is
+    only a fork() from the already initialized process.
+    stdin is fed through a file shared with the forkserver. In args mode the shim appends the
+    arguments of the input (a file shared as well) to argv before main(), the buffer also goes
+    to stdin for targets reading their arguments with AFL_INIT_ARGV() (see afl-help.h).
+    """
+    # the output is already complete when it is read
+    streaming = False
+
+    def __init__(self, exec_path: bytes, shim_path: str = None):
+        self.shim_path = shim_path
+        self._proc = None
+        self._failed = False
+        super().__init__(exec_path)
+
+    def init(self):
+        self._proc = None
+        self._workdir = None
+        self._files = None
+        self._ctl_w = -1
+        self._st_r = -1
+
+    def deinit(self):
+        self._stop()
+        super().deinit()
+
+    def __getstate__(self):
+        # runtime state (process, pipes, files) is per process, start again after unpickling
+        state = super().__getstate__()
+        for key in ('_proc', '_workdir', '_files'):
+            state[key] = None
+        state['_ctl_w'] = state['_st_r'] = -1
+        return state
+
+    def _run_args(self, buffer: bytes):
+        if not self._ensure_started():
+            return super()._run_args(buffer)
+        # AFL_INIT_ARGV() reads the argument line from stdin
+        self._run(buffer + b'\0', buffer.split())
+        if self.exit_code > 0:
+            # keep the same surface as subprocess.run(check=True)
+            self.result = b""
+            self.error = handler.called_process_error(self.exec_argv + buffer.split(), self.exit_code)
+            self.exit_code = -1
+
+    def _run_stdin(self, stdin_data: bytes, args_buffer: bytes = b''):
+        # argv is fixed once the forkserver is up
+        if args_buffer or not self._ensure_started():
+            return super()._run_stdin(stdin_data, args_buffer)
+        self._run(stdin_data)
+
+    def _run(self, stdin_data: bytes, args: list = ()):
+        self.cleanup()
+        in_file, out_file, err_file, args_file = self._files
+        for f in self._files:
+            f.seek(0)
+            f.truncate()
+        in_file.write(stdin_data)
+        in_file.flush()
+        in_file.seek(0)
+        # '\0'-terminated arguments, read by the child before main()
+        args_file.write(b''.join(arg + b'\0' for arg in args))
+        args_file.flush()
+        try:
+            os.write(self._ctl_w, b'\0\0\0\0')
+            pid = self._read_u32(self.timeout)
+            if pid is None:
+                raise RuntimeError("forkserver did not answer")
+            status = self._read_u32(self.timeout)
+            timed_out = status is None
+            if timed_out:
+                os.kill(pid, signal.SIGKILL)
+                status = self._read_u32(None)
+                if status is None:
+                    raise RuntimeError("forkserver died while killing a hung child")
+        except (OSError, RuntimeError) as e:
+            self.error = "Forkserver error: {}".format(e).encode('utf-8', errors='replace')
+            self.exit_code = -1
+            self._stop()
+            return
+        sandbox.SandboxPool.wipe(self._workdir, keep=IO_FILES)
+        out_file.seek(0)
+        err_file.seek(0)
+        out = capture.capture_file(out_file, config.output_cap)
+        self.result = out.value()
+        self.error = capture.capture_file(err_file, config.output_cap).value()
+        if timed_out:
+            self.set_timeout_result(self.result, self.error)
+        else:
+            self.result_digest = out.digest()
+            self.exit_code = handler.exit_code_of(os.waitstatus_to_exitcode(status))
+
+    def _read_u32(self, timeout):
+        if timeout is not None:
+            ready, _, _ = select.select([self._st_r], [], [], timeout)
+            if not ready:
+                return None
+        data = b""
+        while len(data) < 4:
+            chunk = os.read(self._st_r, 4 - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return struct.unpack('<I', data)[0]
+
+    def _ensure_started(self) -> bool:
+        if self._proc is not None and self._proc.poll() is None:
+            return True
+        if self._failed:
+            return False
+        self._stop()
+        self._workdir = self._get_sandbox()
+        self._files = tuple(open(os.path.join(self._workdir, name), 'w+b') for name in IO_FILES)
+        ctl_r, ctl_w = os.pipe()
+        st_r, st_w = os.pipe()
+
+        env = dict(os.environ)
+        env['C2RUST_FORKSRV'] = '1'
+        env['C2RUST_FORKSRV_ARGS'] = os.path.join(self._workdir, IO_FILES[3])
+        if self.shim_path:
+            preload = env.get('LD_PRELOAD')
+            env['LD_PRELOAD'] = self.shim_path + (':' + preload if preload else '')
+            # ASan complains when its runtime is not the first preloaded library
+            asan_opts = env.get('ASAN_OPTIONS')
+            env['ASAN_OPTIONS'] = 'verify_asan_link_order=0' + (':' + asan_opts if asan_opts else '')
+
+        def _setup_fds():
+            os.dup2(ctl_r, FORKSRV_FD)
+            os.dup2(st_w, FORKSRV_FD + 1)
+
+        try:
+            self._proc = subprocess.Popen(
+                self.exec_argv,
+                stdin=self._files[0],
+                stdout=self._files[1],
+                stderr=self._files[2],
+                cwd=self._workdir,
+                env=env,
+                # fds are non-inheritable by default, only the dup2'ed control/status fds leak through
+                close_fds=False,
+                preexec_fn=_setup_fds
+            )
+        except OSError as e:
+            print("Error: Failed to start forkserver for {}: {}".format(self.exec_path, e), file=sys.stderr)
+            self._proc = None
+        finally:
+            os.close(ctl_r)
+            os.close(st_w)
+        self._ctl_w = ctl_w
+        self._st_r = st_r
+        if self._proc is None or self._read_u32(HANDSHAKE_TIMEOUT) is None:
+            print("Warning: forkserver handshake failed for {}, falling back to plain execution"
+                  .format(self.exec_path), file=sys.stderr)
+            self._failed = True
+            self._stop()
+            return False
+        return True
+
+    def _stop(self):
+        if self._proc is not None:
+            if self._proc.poll() is None:
+                self._proc.kill()
+            self._proc.wait()
+            self._proc = None
+        for fd in (self._ctl_w, self._st_r):
+            if fd >= 0:
+                os.close(fd)
+        self._ctl_w = self._st_r = -1
+        if self._files is not None:
+            for f in self._files:
+                f.close()
+            self._files = None
+        if self._workdir is not None:
+            sandbox.SandboxPool.wipe(self._workdir)
+            self._workdir = None
+
+    def __del__(self):
+        try:
+            self._stop()
+        except Exception:
+            pass
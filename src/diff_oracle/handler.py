@@ -1,6 +1,18 @@
 import os
+import sys
+import time
+import shlex
+import select
+import selectors
 import subprocess
-import tempfile
+import src.utils.config as config
+import src.diff_oracle.sandbox as sandbox
+import src.diff_oracle.timing as timing
+import src.diff_oracle.capture as capture
+import src.diff_oracle.stream_compare as stream_compare
+
+# appended to stderr when a run is killed for exceeding the timeout
+TIMEOUT_ERROR = b"\nProcess timeout"
 
 def read_all(fd):
     """read all data in fd"""
@@ -12,86 +24,211 @@ def read_all(fd):
         blocks.append(chunk)
     return b"".join(blocks)
 
+def exit_code_of(returncode: int) -> int:
+    """
+    report signals as 128 + signum like a shell does
+    """
+    if returncode < 0:
+        return 128 - returncode
+    return returncode
+
+def called_process_error(cmd, returncode: int) -> bytes:
+    """
+    stderr reported by the args mode for a non-zero exit, same as subprocess.run(check=True)
+    """
+    return str(subprocess.CalledProcessError(returncode, cmd)).encode('utf-8', errors='replace')
+
 class Handler:
+    # stdout can be compared while the program runs (execute_program_streaming)
+    streaming = True
+
     def __init__(self, exec_path: bytes):
         self.exec_path = exec_path
+        # tokenize the command once, the input buffer is appended as separate argv entries
+        self.exec_argv = [os.fsencode(t) for t in shlex.split(os.fsdecode(exec_path))]
         self.result = b""
         self.error = b""
         self.exit_code = -1
+        self.timed_out = False
+        # seconds, replaced by the calibrated value of this binary (timing.calibrate)
+        self.timeout = config.exec_timeout
+        self.stats = timing.ExecStats()
+        self.hangs = timing.HangCache()
+        self.sandbox = None
         self.init()
 
     def init(self):
         pass
 
     def deinit(self):
-        pass
+        if self.sandbox is not None:
+            sandbox.get_pool().release(self.sandbox)
+            self.sandbox = None
+
+    def __getstate__(self):
+        # sandboxes belong to the pool of the current process
+        state = self.__dict__.copy()
+        state['sandbox'] = None
+        # copies count their own executions, hangs found so far stay known
+        state['stats'] = timing.ExecStats()
+        return state
 
     def cleanup(self):
         self.result = b""
         self.error = b""
         self.exit_code = -1
+        self.timed_out = False
+        self.aborted = False
+        # digest of the whole stdout when it was cut at config.output_cap
+        self.result_digest = None
+
+    def set_timeout_result(self, stdout: bytes = b"", stderr: bytes = b""):
+        self.result = stdout
+        self.error = stderr + TIMEOUT_ERROR
+        self.exit_code = -1
+        self.timed_out = True
+
+    def _get_sandbox(self) -> str:
+        if self.sandbox is None:
+            self.sandbox = sandbox.get_pool().acquire()
+        return self.sandbox
 
     def execute_program_subprocess_args(self, buffer: bytes):
-        self.cleanup()
-        # Create command
-        cmd = self.exec_path + b' ' + buffer
-        # Create a temporary directory for execution
-        with tempfile.TemporaryDirectory() as tmpdir:
-            original_dir = os.getcwd()
-            os.chdir(tmpdir)
-            try:
-                completed = subprocess.run(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    timeout=10,
-                    check=True,
-                    bufsize=0,
-                    shell=True
-                )
-                self.result = completed.stdout
-                self.error = completed.stderr
-                self.exit_code = completed.returncode
-            except subprocess.TimeoutExpired as e:
-                self.result = e.stdout if e.stdout is not None else b""
-                self.error = (e.stderr if e.stderr is not None else b"") + b"\nProcess timeout"
-                self.exit_code = -1
-            except Exception as e:
-                self.error = str(e).encode('utf-8', errors='replace')
-                self.exit_code = -1
-            finally:
-                # Always return to original directory
-                os.chdir(original_dir)
+        self._timed(timing.HangCache.key(buffer), self._run_args, buffer)
 
     def execute_program_subprocess_stdin(self, stdin_data: bytes, args_buffer: bytes = b''):
+        self._timed(timing.HangCache.key(args_buffer, stdin_data), self._run_stdin, stdin_data, args_buffer)
+
+    def execute_program_streaming(self, args_buffer: bytes, stdin_data: bytes, expected):
+        """
+        run the program while comparing its stdout with the known output of the other implementation,
+        it is killed as soon as the outputs certainly diverge (self.aborted, result holds the prefix read)
+        :param stdin_data: None for the args mode
+        :param expected: DetectionResult of the other implementation for the same input
+        """
+        if not self.streaming:
+            if stdin_data is None:
+                return self.execute_program_subprocess_args(args_buffer)
+            return self.execute_program_subprocess_stdin(stdin_data, args_buffer)
+        self._timed(timing.HangCache.key(args_buffer, stdin_data), self._execute, args_buffer, stdin_data,
+                    stream_compare.StreamComparator(expected))
+
+    def _timed(self, key: bytes, run: callable, *args):
+        """
+        run one execution, an input which timed out before is not executed again
+        """
+        if key in self.hangs:
+            self.cleanup()
+            self.set_timeout_result()
+            self.stats.hang_hits += 1
+            return
+        start = time.perf_counter()
+        run(*args)
+        self.stats.record(time.perf_counter() - start, self.timed_out)
+        if self.timed_out:
+            self.hangs.add(key)
+
+    def _run_args(self, buffer: bytes):
+        self._execute(buffer, None)
+
+    def _run_stdin(self, stdin_data: bytes, args_buffer: bytes = b''):
+        self._execute(args_buffer, stdin_data)
+
+    def _execute(self, args_buffer: bytes, stdin_data: bytes, comparator: stream_compare.StreamComparator = None):
+        """
+        run once, stdout and stderr are captured up to config.output_cap bytes each
+        :param stdin_data: None for the args mode, which reports like subprocess.run(check=True)
+        """
         self.cleanup()
-        cmd = self.exec_path + b' ' + args_buffer
-        with tempfile.TemporaryDirectory() as tmpdir:
-            original_dir = os.getcwd()
-            os.chdir(tmpdir)
-            try:
-                completed = subprocess.run(
-                    cmd,
-                    input=stdin_data,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    timeout=10,
-                    check=False,
-                    bufsize=0,
-                    shell=True
-                )
-                self.result = completed.stdout
-                self.error = completed.stderr
-                self.exit_code = completed.returncode
-            except subprocess.TimeoutExpired as e:
-                self.result = e.stdout if e.stdout is not None else b""
-                self.error = (e.stderr if e.stderr is not None else b"") + b"\nProcess timeout"
-                self.exit_code = -1
-            except Exception as e:
-                self.error = str(e).encode('utf-8', errors='replace')
-                self.exit_code = -1
-            finally:
-                os.chdir(original_dir)
+        cmd = self.exec_argv + args_buffer.split()
+        cwd = self._get_sandbox()
+        try:
+            proc = subprocess.Popen(
+                cmd,
+                stdin=subprocess.PIPE if stdin_data is not None else subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                bufsize=0,
+                cwd=cwd
+            )
+        except Exception as e:
+            self.error = str(e).encode('utf-8', errors='replace')
+            self.exit_code = -1
+            sandbox.SandboxPool.wipe(cwd)
+            return
+        out = capture.StreamCapture(config.output_cap)
+        err = capture.StreamCapture(config.output_cap)
+        try:
+            self._communicate(proc, stdin_data, out, err, comparator)
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+            proc.wait()
+            for f in (proc.stdin, proc.stdout, proc.stderr):
+                if f is not None:
+                    f.close()
+            sandbox.SandboxPool.wipe(cwd)
+        if self.timed_out:
+            self.set_timeout_result(out.value(), err.value())
+        elif self.aborted:
+            # the decisive prefix is kept for the log, stderr and the exit status of a killed process mean nothing
+            self.result = out.value()[:comparator.cut]
+            self.error = b""
+            self.exit_code = 0
+        elif stdin_data is None and proc.returncode != 0:
+            self.error = called_process_error(cmd, proc.returncode)
+            self.exit_code = -1
+        else:
+            self.result = out.value()
+            self.result_digest = out.digest()
+            self.error = err.value()
+            self.exit_code = exit_code_of(proc.returncode)
+
+    def _communicate(self, proc: subprocess.Popen, stdin_data: bytes, out: capture.StreamCapture,
+                     err: capture.StreamCapture, comparator: stream_compare.StreamComparator = None):
+        deadline = time.monotonic() + self.timeout
+        pending = memoryview(stdin_data or b"")
+        with selectors.DefaultSelector() as sel:
+            if proc.stdin is not None:
+                if pending:
+                    os.set_blocking(proc.stdin.fileno(), False)
+                    sel.register(proc.stdin, selectors.EVENT_WRITE)
+                else:
+                    proc.stdin.close()
+            sel.register(proc.stdout, selectors.EVENT_READ)
+            sel.register(proc.stderr, selectors.EVENT_READ)
+            while len(sel.get_map()):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timed_out = True
+                    return
+                for key, _ in sel.select(remaining):
+                    if key.fileobj is proc.stdin:
+                        try:
+                            pending = pending[os.write(key.fd, pending[:select.PIPE_BUF]):]
+                        except BlockingIOError:
+                            continue
+                        except BrokenPipeError:
+                            pending = pending[:0]
+                        if not pending:
+                            sel.unregister(proc.stdin)
+                            proc.stdin.close()
+                        continue
+                    chunk = os.read(key.fd, 65536)
+                    if not chunk:
+                        sel.unregister(key.fileobj)
+                    elif key.fileobj is proc.stderr:
+                        err.feed(chunk)
+                    else:
+                        out.feed(chunk)
+                        if comparator is not None and comparator.feed(chunk):
+                            self.aborted = True
+                            return
+        try:
+            proc.wait(max(0.0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            # closed its pipes but kept running
+            self.timed_out = True
 
     def get_result(self):
         return self.result
@@ -101,3 +238,25 @@ class Handler:
 
     def get_exit_code(self):
         return self.exit_code
+
+    def report(self):
+        if self.stats.count or self.stats.hang_hits:
+            print(self.stats.summary(self.exec_path.decode('utf-8', errors='replace'), self.timeout),
+                  file=sys.stderr)
+
+def make_handler(exec_path: bytes) -> Handler:
+    """
+    build the execution handler selected in config
+    """
+    if config.persistent:
+        import src.diff_oracle.persistent as persistent
+        return persistent.PersistentHandler(exec_path)
+    if config.forkserver:
+        if config.args_read and not config.forkserver_shim:
+            # only the shim passes the arguments of each input as argv
+            print("Warning: --forkserver without a shim can't pass arguments, using plain execution for {}"
+                  .format(exec_path.decode('utf-8', errors='replace')), file=sys.stderr)
+            return Handler(exec_path)
+        import src.diff_oracle.forkserver as forkserver
+        return forkserver.ForkserverHandler(exec_path, config.forkserver_shim)
+    return Handler(exec_path)
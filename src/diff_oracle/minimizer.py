@@ -0,0 +1,261 @@
+import os
+import re
+import sys
+from google.protobuf.descriptor import FieldDescriptor
+import src.utils.config as config
+import src.utils.divergence_log as divergence_log
+import src.algo.evaluator as evaluator
+
+"""
+Minimization of divergent inputs.
+An input is reduced while it still makes the C and Rust programs diverge the same way: same
+bucket signature (kind of mismatch, result types, exit codes, output size class) as the original,
+so the reduced input reproduces the logged divergence rather than another one.
+Args/stdin inputs: ddmin over whitespace tokens, then over the bytes of a single remaining token,
+then integer tokens are shrunk towards 0.
+Protobuf inputs: field-wise, fields are cleared, repeated fields cut, numbers halved and
+strings/bytes shortened, recursively through nested messages.
+Candidates of one step are evaluated together, across worker processes when there are several,
+through Base_Checker.divergence_signature.
+Only the divergences logged by the current run are minimized, not the ones earlier campaigns left
+in the log.
+"""
+
+# a token keeps the whitespace before it, so joining tokens keeps the layout of the input
+_TOKEN = re.compile(rb'\s*\S+')
+_INT = re.compile(rb'-?\d+')
+# elements of a repeated field tried one by one
+MAX_REPEATED_EDITS = 64
+
+_NUMERIC_TYPES = (
+    FieldDescriptor.TYPE_INT32, FieldDescriptor.TYPE_INT64, FieldDescriptor.TYPE_UINT32,
+    FieldDescriptor.TYPE_UINT64, FieldDescriptor.TYPE_SINT32, FieldDescriptor.TYPE_SINT64,
+    FieldDescriptor.TYPE_FIXED32, FieldDescriptor.TYPE_FIXED64, FieldDescriptor.TYPE_SFIXED32,
+    FieldDescriptor.TYPE_SFIXED64, FieldDescriptor.TYPE_FLOAT, FieldDescriptor.TYPE_DOUBLE,
+)
+
+class Minimizer:
+    def __init__(self, checker, workers: int = 1, budget: int = 2000):
+        """
+        :param checker: Base_Checker of the campaign
+        :param workers: processes evaluating the candidates of a step
+        :param budget: max evaluations per input
+        """
+        self.budget = budget
+        self._workers = workers
+        if workers > 1:
+            self._evaluator = evaluator.PoolEvaluator(checker.divergence_signature, workers)
+        else:
+            self._evaluator = evaluator.SerialEvaluator(checker.divergence_signature)
+        # input -> divergence signature (None when it doesn't diverge), the pool workers don't share caches
+        self._verdicts = {}
+        self._evals = 0
+        # signature of the input being minimized
+        self._target = None
+
+    def close(self):
+        self._evaluator.close()
+
+    def _first_diverging(self, candidates: list[bytes]) -> int:
+        """
+        index of the first candidate which still diverges like the input being minimized, None if there is none
+        candidates are evaluated in chunks of a few per worker, in order
+        """
+        chunk = self._workers * 4 if self._workers > 1 else 1
+        for start in range(0, len(candidates), chunk):
+            part = candidates[start:start + chunk]
+            todo = list(dict.fromkeys(x for x in part if x not in self._verdicts))
+            if todo:
+                if self._evals >= self.budget:
+                    return None
+                self._evals += len(todo)
+                for x, sig in zip(todo, self._evaluator.evaluate(todo)):
+                    self._verdicts[x] = sig
+            for i, x in enumerate(part):
+                if self._verdicts[x] == self._target:
+                    return start + i
+        return None
+
+    def _start(self, x: bytes) -> bool:
+        """
+        take x as the input to minimize, False when it does not diverge
+        """
+        self._evals = 0
+        if x not in self._verdicts:
+            self._evals += 1
+            self._verdicts[x] = self._evaluator.evaluate([x])[0]
+        self._target = self._verdicts[x]
+        return self._target is not None
+
+    def _ddmin(self, units: list, join: callable) -> list:
+        """
+        ddmin over the complements: drop one of n chunks, n doubles when no reduction diverges
+        """
+        n = 2
+        while len(units) >= 2:
+            n = min(n, len(units))
+            size = len(units) / n
+            bounds = [(int(i * size), int((i + 1) * size)) for i in range(n)]
+            complements = [units[:a] + units[b:] for a, b in bounds]
+            found = self._first_diverging([join(c) for c in complements])
+            if found is not None:
+                units = complements[found]
+                n = max(n - 1, 2)
+            elif n == len(units):
+                break
+            else:
+                n = min(n * 2, len(units))
+        return units
+
+    def _shrink_ints(self, tokens: list[bytes], join: callable) -> list[bytes]:
+        """
+        replace integer tokens by 0, then by half their value, while the input diverges
+        """
+        changed = True
+        while changed:
+            changed = False
+            for i, token in enumerate(tokens):
+                m = _INT.fullmatch(token.lstrip())
+                if m is None or int(m.group()) == 0:
+                    continue
+                value = int(m.group())
+                space = token[:len(token) - len(token.lstrip())]
+                options = [b'0', str(_half(value)).encode()]
+                if value < 0:
+                    options.append(str(-value).encode())
+                candidates = [tokens[:i] + [space + o] + tokens[i + 1:] for o in options]
+                found = self._first_diverging([join(c) for c in candidates])
+                if found is not None:
+                    tokens = candidates[found]
+                    changed = True
+        return tokens
+
+    def minimize_tokens(self, x: bytes) -> bytes:
+        """
+        minimize an args/stdin input, x is returned unchanged when it does not diverge
+        """
+        if not self._start(x):
+            return x
+        tail = x[len(x.rstrip()):]
+        join = lambda t: b''.join(t) + tail
+        tokens = self._ddmin(_TOKEN.findall(x), join)
+        if len(tokens) == 1:
+            token = tokens[0].lstrip()
+            space = tokens[0][:len(tokens[0]) - len(token)]
+            kept = self._ddmin([token[i:i + 1] for i in range(len(token))], lambda t: space + join(t))
+            tokens = [space + b''.join(kept)]
+        return join(self._shrink_ints(tokens, join))
+
+    def minimize_proto(self, x: bytes, message_class) -> bytes:
+        """
+        minimize a serialized protobuf message field by field
+        :param message_class: generated class of the message, ProtobufHandler.message_class
+        """
+        if not self._start(x):
+            return x
+        root = message_class()
+        root.ParseFromString(x)
+        while True:
+            candidates = []
+            for edit in _proto_edits(root):
+                m = message_class()
+                m.CopyFrom(root)
+                _apply_edit(m, *edit)
+                data = m.SerializeToString()
+                if len(data) <= len(x) and data != x:
+                    candidates.append(data)
+            found = self._first_diverging(candidates)
+            if found is None:
+                return x
+            x = candidates[found]
+            root.ParseFromString(x)
+
+def _half(value):
+    """
+    half of a number rounded towards 0, exact for integers of any size
+    """
+    if isinstance(value, int):
+        return value // 2 if value >= 0 else -(-value // 2)
+    return type(value)(int(value / 2))
+
+def _proto_edits(msg, path: tuple = ()):
+    """
+    edits which simplify a message: (path to the sub-message, field name, action, argument)
+    """
+    for field, value in msg.ListFields():
+        name = field.name
+        yield path, name, 'clear', None
+        if field.label == FieldDescriptor.LABEL_REPEATED:
+            n = len(value)
+            if n > 1:
+                yield path, name, 'keep', (0, n // 2)
+                yield path, name, 'keep', (n // 2, n)
+            for i in range(min(n, MAX_REPEATED_EDITS)):
+                yield path, name, 'delete', i
+            if field.type == FieldDescriptor.TYPE_MESSAGE:
+                for i in range(min(n, MAX_REPEATED_EDITS)):
+                    yield from _proto_edits(value[i], path + ((name, i),))
+        elif field.type == FieldDescriptor.TYPE_MESSAGE:
+            yield from _proto_edits(value, path + ((name, None),))
+        elif field.type in _NUMERIC_TYPES and _half(value) != 0:
+            yield path, name, 'set', _half(value)
+        elif field.type in (FieldDescriptor.TYPE_STRING, FieldDescriptor.TYPE_BYTES) and len(value) > 1:
+            yield path, name, 'set', value[:len(value) // 2]
+
+def _apply_edit(msg, path: tuple, name: str, action: str, arg):
+    for field_name, index in path:
+        msg = getattr(msg, field_name) if index is None else getattr(msg, field_name)[index]
+    if action == 'clear':
+        msg.ClearField(name)
+    elif action == 'keep':
+        container = getattr(msg, name)
+        del container[arg[1]:]
+        del container[:arg[0]]
+    elif action == 'delete':
+        del getattr(msg, name)[arg]
+    else:
+        setattr(msg, name, arg)
+
+def logged_inputs(path: str, since: float = None) -> list[bytes]:
+    """
+    divergent inputs of a divergence log, the smallest one of every bucket
+    records without a bucket are all kept
+    :param since: only records logged from this time on, None for all
+    """
+    smallest = {}
+    paths = [path] + ["{}.{}".format(path, i) for i in range(1, config.divergence_log_backups + 1)]
+    for p in paths:
+        if not os.path.exists(p):
+            continue
+        for r in divergence_log.read_records(p):
+            if since is not None and r["time"] < since:
+                continue
+            x = divergence_log.record_input(r)
+            key = r.get("bucket", x)
+            if key not in smallest or len(x) < len(smallest[key]):
+                smallest[key] = x
+    return list(dict.fromkeys(smallest.values()))
+
+def minimize_logged(checker, out_dir: str, message_class=None):
+    """
+    minimize the divergent inputs of config.divergence_log into out_dir, one file per input
+    :param message_class: protobuf message class for protobuf inputs, None for args/stdin inputs
+    """
+    # the queued records have to be on disk before reading the log
+    divergence_log.close()
+    inputs = logged_inputs(config.divergence_log, divergence_log.run_start)
+    if not inputs:
+        return
+    os.makedirs(out_dir, exist_ok=True)
+    minimizer = Minimizer(checker, config.workers, config.minimize_budget)
+    try:
+        for i, x in enumerate(inputs):
+            if message_class is not None:
+                small = minimizer.minimize_proto(x, message_class)
+            else:
+                small = minimizer.minimize_tokens(x)
+            with open(os.path.join(out_dir, "min_{:04d}".format(i)), "wb") as f:
+                f.write(small)
+            print("minimized divergence {}: {} -> {} bytes".format(i, len(x), len(small)), file=sys.stderr)
+    finally:
+        minimizer.close()
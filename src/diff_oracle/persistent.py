@@ -0,0 +1,159 @@
+import os
+import select
+import struct
+import subprocess
+import src.utils.config as config
+import src.diff_oracle.handler as handler
+import src.diff_oracle.sandbox as sandbox
+import src.diff_oracle.capture as capture
+
+# stderr kept from a dying persistent process
+CRASH_STDERR_LIMIT = 1 << 16
+# extra seconds for the first input of a freshly started process
+START_GRACE = 1.0
+
+class PersistentHandler(handler.Handler):
+    """
+    Handler talking to a long-lived target built with persistent.h (C) or persistent.rs (Rust).
+    Each input is sent as a length-prefixed frame on stdin, the target answers with its exit
+    code, stdout and stderr. A crash or hang kills the process, it is respawned transparently
+    on the next input.
+    Only stdin input is supported, args mode and extra arguments use the plain handler.
+    """
+    # the output is already complete when it is read
+    streaming = False
+
+    def __init__(self, exec_path: bytes):
+        self._proc = None
+        super().__init__(exec_path)
+
+    def init(self):
+        self._proc = None
+        self.spawns = 0
+
+    def deinit(self):
+        self._stop()
+        super().deinit()
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state['_proc'] = None
+        return state
+
+    def _run_stdin(self, stdin_data: bytes, args_buffer: bytes = b''):
+        if args_buffer:
+            return super()._run_stdin(stdin_data, args_buffer)
+        self.cleanup()
+        try:
+            try:
+                out, err, self.exit_code = self._exchange(stdin_data)
+            except (EOFError, BrokenPipeError):
+                if not self._answered:
+                    raise
+                # the process was still exiting from an exit() of the previous input
+                self._collect_crash()
+                out, err, self.exit_code = self._exchange(stdin_data)
+            self.result = out.value()
+            self.result_digest = out.digest()
+            self.error = err.value()
+        except TimeoutError:
+            self._stop()
+            self.set_timeout_result()
+        except (EOFError, BrokenPipeError):
+            # the target crashed on this input
+            self.error, self.exit_code = self._collect_crash()
+        except OSError as e:
+            self._stop()
+            self.error = str(e).encode('utf-8', errors='replace')
+            self.exit_code = -1
+        if self._proc is not None and self._proc.poll() is not None:
+            # exit() inside the target still answered, but the process is gone
+            self._stop()
+        sandbox.SandboxPool.wipe(self.sandbox)
+
+    def _exchange(self, stdin_data: bytes) -> (capture.StreamCapture, capture.StreamCapture, int):
+        self._ensure_started()
+        os.write(self._proc.stdin.fileno(), struct.pack('<I', len(stdin_data)) + stdin_data)
+        code, out_len = struct.unpack('<iI', self._read(8))
+        out = capture.StreamCapture(config.output_cap)
+        self._read(out_len, out)
+        err_len = struct.unpack('<I', self._read(4))[0]
+        err = capture.StreamCapture(config.output_cap)
+        self._read(err_len, err)
+        self._answered += 1
+        return out, err, code
+
+    def _read(self, n: int, sink: capture.StreamCapture = None) -> bytes:
+        """
+        read exactly n bytes of the response, into sink when given
+        """
+        fd = self._proc.stdout.fileno()
+        err_fd = self._proc.stderr.fileno()
+        watched = [fd, err_fd] if not self._stderr_closed else [fd]
+        timeout = self.timeout if self._answered else self.timeout + START_GRACE
+        chunks = []
+        while n:
+            ready, _, _ = select.select(watched, [], [], timeout)
+            if not ready:
+                raise TimeoutError()
+            if err_fd in ready:
+                # keep the stderr pipe drained, crash reports of sanitizers go there
+                chunk = os.read(err_fd, 65536)
+                if not chunk:
+                    self._stderr_closed = True
+                    watched = [fd]
+                self._stderr_tail = (self._stderr_tail + chunk)[-CRASH_STDERR_LIMIT:]
+            if fd in ready:
+                chunk = os.read(fd, min(n, 1 << 16))
+                if not chunk:
+                    raise EOFError()
+                if sink is not None:
+                    sink.feed(chunk)
+                else:
+                    chunks.append(chunk)
+                n -= len(chunk)
+        return b"".join(chunks)
+
+    def _collect_crash(self) -> (bytes, int):
+        proc = self._proc
+        try:
+            _, err = proc.communicate(timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            _, err = proc.communicate()
+        self._proc = None
+        return self._stderr_tail + (err or b""), handler.exit_code_of(proc.returncode)
+
+    def _ensure_started(self):
+        if self._proc is not None and self._proc.poll() is None:
+            return
+        self._stop()
+        env = dict(os.environ)
+        env['C2RUST_PERSISTENT'] = '1'
+        self._proc = subprocess.Popen(
+            self.exec_argv,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=self._get_sandbox(),
+            env=env,
+            bufsize=0
+        )
+        self._stderr_tail = b""
+        self._stderr_closed = False
+        self._answered = 0
+        self.spawns += 1
+
+    def _stop(self):
+        if self._proc is None:
+            return
+        if self._proc.poll() is None:
+            self._proc.kill()
+        self._proc.communicate()
+        self._proc = None
+
+    def __del__(self):
+        try:
+            self._stop()
+        except Exception:
+            pass
@@ -77,8 +77,8 @@ class ProtobufDriver():
     """
     def basic_check(self, c_executable: str, rust_executable: str):
         afl_cases = self._process(self._afl_queue_path)
-        c_handler = handler.Handler(c_executable.encode('utf-8'))
-        r_handler = handler.Handler(rust_executable.encode('utf-8'))
+        c_handler = handler.make_handler(c_executable.encode('utf-8'))
+        r_handler = handler.make_handler(rust_executable.encode('utf-8'))
         for case in afl_cases:
             # execute c
             c_handler.execute_program_subprocess_stdin(case)
@@ -98,6 +98,9 @@ class ProtobufDriver():
     def get_proto_handler(self):
         return self._proto_handler
 
+    def get_cases(self) -> list[bytes]:
+        return self._process(self._afl_queue_path)
+
     def _process(self, folder_path: str) -> list[bytes]:
         if not os.path.exists(folder_path) or not os.path.isdir(folder_path):
             print(f"Error: The path '{folder_path}' does not exist or is not a directory.")
@@ -5,9 +5,19 @@ import src.algo.cma_es as ce
 import src.algo.mo_cma as mo_cma
 import src.algo.cluster_seeds as cluster
 import src.algo.proto_cma_es as proto_cma_es
+import src.algo.evaluator as evaluator
+import src.algo.islands as islands
+import src.algo.steady_state as steady_state
+import src.algo.novelty as novelty
+import src.algo.dedup as dedup
+import src.algo.scheduler as scheduler
 import src.utils.config as config
 import src.utils.constant as constant
+import src.utils.eval_store as eval_store
+import src.utils.checkpoint as checkpoint
 import src.diff_oracle.handler as handler
+import src.diff_oracle.timing as timing
+import src.diff_oracle.minimizer as minimizer
 import src.diff_oracle.parse_afl_seed as parser
 import src.diff_oracle.checker.args_checker as args_checker
 import src.diff_oracle.checker.stdin_checker as stdin_checker
@@ -26,29 +36,42 @@ def run_subprocess(file_path: str, c_program: str, rust_program: str):
         sys.exit(1)
     buffers = content.split(b'\n')
     data = handle_buffers_numpy(buffers)
-    c_handler = handler.Handler(c_program.encode('utf-8'))
-    r_handler = handler.Handler(rust_program.encode('utf-8'))
+    c_handler = handler.make_handler(c_program.encode('utf-8'))
+    r_handler = handler.make_handler(rust_program.encode('utf-8'))
 
     checker = None
     if config.args_read:
         checker = args_checker.Args_Checker(c_handler, r_handler)
     elif config.stdin_read:
         checker = stdin_checker.Stdin_Checker(c_handler, r_handler)
+    attach_eval_store(checker, c_program, rust_program)
+    calibrate_timeouts(checker, buffers)
     if config.char_type_data:
         char_test(data, checker.unicode_objective)
     elif config.int_type_data:
         int_test(data, checker.int_step_objective)
+    report_eval_store(checker)
+    report_timings(checker)
+    checker.report_divergences()
+    minimize_divergences(checker)
 
 """
 Begin the test campaign, support program read input files
 """
 def run_afl_min_seeds(seed_dir: str, c_program: str, rust_program: str):
-    c_handler = handler.Handler(c_program.encode('utf-8'))
-    r_handler = handler.Handler(rust_program.encode('utf-8'))
+    c_handler = handler.make_handler(c_program.encode('utf-8'))
+    r_handler = handler.make_handler(rust_program.encode('utf-8'))
     checker = args_checker.Args_Checker(c_handler, r_handler)
     # parse the seed_dir
-    data = parser.handle(seed_dir, checker)
+    attach_eval_store(checker, c_program, rust_program)
+    seeds = parser.read_seeds(seed_dir)
+    calibrate_timeouts(checker, seeds)
+    data = parser.handle(seed_dir, checker, seeds)
     byte_test(data, checker.byte_step_objective)
+    report_eval_store(checker)
+    report_timings(checker)
+    checker.report_divergences()
+    minimize_divergences(checker)
 
 """
 Run test for function-level fuzzing
@@ -60,17 +83,159 @@ def run_proto_buf_cases(afl_queue_path: str, c_program: str, rust_program: str,
     afl_case_vec, min_bound_vec, max_bound_vec, case_field_infos = driver.to_vectors()
     # afl_case_vec, min_bound_vec, max_bound_vec, case_field_infos = driver.to_byte_vectors()
 
-    c_handler = handler.Handler(c_program.encode('utf-8'))
-    r_handler = handler.Handler(rust_program.encode('utf-8'))
+    c_handler = handler.make_handler(c_program.encode('utf-8'))
+    r_handler = handler.make_handler(rust_program.encode('utf-8'))
     # use stdin for reading data by default
     checker = stdin_checker.Stdin_Checker(c_handler, r_handler)
-    for i in range(len(afl_case_vec)):
-        case_vec = afl_case_vec[i]
-        runner = proto_cma_es.PROTO_CMA_ES(case_vec, checker.proto_buf_objective,
-                        (min_bound_vec[i], max_bound_vec[i]), case_field_infos[i], driver.get_proto_handler())
-        runner.run()
+    attach_eval_store(checker, c_program, rust_program)
+    calibrate_timeouts(checker, driver.get_cases())
+    driver_ss = make_steady_state(checker.proto_buf_objective)
+    ckpt = checkpoint.open_campaign('proto', [len(afl_case_vec)])
+    state = ckpt.load() if ckpt is not None else {}
+    try:
+        for i in range(state.get('index', 0), len(afl_case_vec)):
+            case_vec = afl_case_vec[i]
+            save = (lambda search, i=i: ckpt.save(i, search)) if ckpt is not None else None
+            runner = proto_cma_es.PROTO_CMA_ES(case_vec, checker.proto_buf_objective,
+                            (min_bound_vec[i], max_bound_vec[i]), case_field_infos[i], driver.get_proto_handler(),
+                            driver_ss, save, state.get('search') if i == state.get('index') else None)
+            runner.run()
+            if ckpt is not None:
+                ckpt.save(i + 1)
+    finally:
+        if driver_ss is not None:
+            driver_ss.close()
+    report_eval_store(checker)
+    report_timings(checker)
+    checker.report_divergences()
+    minimize_divergences(checker, driver.get_proto_handler().message_class)
     return
 
+"""
+Use the persistent evaluation cache if configured
+"""
+def attach_eval_store(checker, c_program: str, rust_program: str):
+    if config.eval_store:
+        # novelty runs store hit maps instead of coverage percentages
+        variant = ':novelty' if config.cov_novelty else ''
+        checker.eval_store = eval_store.EvalStore(config.eval_store, c_program, rust_program, config.eval_store_size,
+                                                  variant)
+
+def report_eval_store(checker):
+    if checker.eval_store is not None:
+        checker.eval_store.report()
+
+"""
+Per-binary execution timeouts derived from the seed runtimes
+"""
+def calibrate_timeouts(checker, seeds: list[bytes]):
+    if config.calibrate_timeout:
+        timing.calibrate(checker, seeds, config.exec_timeout)
+
+def report_timings(checker):
+    checker.c_handler.report()
+    checker.r_handler.report()
+
+"""
+Shrink the divergent inputs of the campaign
+"""
+def minimize_divergences(checker, message_class=None):
+    if config.minimize_dir:
+        minimizer.minimize_logged(checker, config.minimize_dir, message_class)
+
+"""
+Steady-state driver for the single-objective CMA-ES engines, None when not configured
+"""
+def make_steady_state(obj_func: callable):
+    if not config.steady_state:
+        return None
+    return steady_state.SteadyStateDriver(obj_func, config.workers)
+
+"""
+Multi-objective search of one input dimension, on islands when configured
+"""
+def search(dim: int, seeds: np.ndarray, obj_func: callable, bounds: tuple, population_evaluator, virgin_map,
+           lattice, save: callable = None, resume_state: bytes = None):
+    if config.islands > 1:
+        # islands are checkpointed per dimension only
+        islands.run_islands(dim, seeds, obj_func, bounds, config.islands, config.migration_interval,
+                            config.migrants)
+        return
+    runner = mo_cma.MO_CMA_ES(dim, seeds, obj_func, bounds, population_evaluator, virgin_map, lattice=lattice,
+                              checkpoint=save, resume_state=resume_state)
+    runner.run()
+
+"""
+Seeds of one dimension group as an array
+"""
+def prepare_seeds(dim: int, seeds, convert: callable = None) -> np.ndarray:
+    if convert is not None and isinstance(seeds, list):
+        if all(isinstance(seed, bytes) for seed in seeds):
+            seeds = convert(dim, seeds)
+    # type check
+    assert isinstance(seeds, np.ndarray), "seeds should be a NumPy array"
+    return seeds
+
+"""
+Search every dimension group of the campaign, resuming from the checkpoint when configured
+"""
+def run_campaign(kind: str, data: dict, obj_func: callable, bounds: tuple, convert: callable = None):
+    if config.schedule:
+        schedule_campaign(kind, data, obj_func, bounds, convert)
+        return
+    population_evaluator = evaluator.make_evaluator(obj_func)
+    ckpt = checkpoint.open_campaign(kind, [int(dim) for dim in data])
+    state = ckpt.load() if ckpt is not None else {}
+    virgin_map = state.get('virgin_map')
+    if virgin_map is None and config.cov_novelty:
+        virgin_map = novelty.VirginMap()
+    lattice = state.get('lattice')
+    if lattice is None and config.dedup:
+        lattice = dedup.LatticeIndex(config.dedup_size)
+    try:
+        for index, (dim, seeds) in enumerate(data.items()):
+            if index < state.get('index', 0):
+                continue
+            seeds = prepare_seeds(dim, seeds, convert)
+            save = None
+            if ckpt is not None:
+                save = lambda search, index=index: ckpt.save(index, search, virgin_map=virgin_map, lattice=lattice)
+            search(dim, seeds, obj_func, bounds, population_evaluator, virgin_map, lattice, save,
+                   state.get('search') if index == state.get('index') else None)
+            if ckpt is not None:
+                ckpt.save(index + 1, virgin_map=virgin_map, lattice=lattice)
+    finally:
+        population_evaluator.close()
+
+"""
+Search the dimension groups in slices picked by the bandit scheduler, under the campaign budget
+"""
+def schedule_campaign(kind: str, data: dict, obj_func: callable, bounds: tuple, convert: callable = None):
+    arms = [scheduler.Arm(index, dim, prepare_seeds(dim, seeds, convert))
+            for index, (dim, seeds) in enumerate(data.items())]
+    sched = scheduler.Scheduler(arms, obj_func, bounds, config.schedule_gens, config.schedule_slice,
+                                config.parallel_arms, config.budget_time, config.budget_evals)
+    # a sequential checkpoint can't be resumed by the scheduler and vice versa
+    ckpt = checkpoint.open_campaign(kind + ':schedule', [int(dim) for dim in data])
+    state = ckpt.load() if ckpt is not None else {}
+    if state.get('search') is not None:
+        sched.restore(state['search'])
+    virgin_map = state.get('virgin_map')
+    if virgin_map is None and config.cov_novelty:
+        virgin_map = novelty.VirginMap()
+    lattice = state.get('lattice')
+    if lattice is None and config.dedup:
+        lattice = dedup.LatticeIndex(config.dedup_size)
+    save = None
+    if ckpt is not None:
+        save = lambda search: ckpt.save(0, search, virgin_map=virgin_map, lattice=lattice)
+    population_evaluator = evaluator.make_evaluator(obj_func)
+    try:
+        sched.run(population_evaluator, virgin_map, lattice, save)
+    finally:
+        population_evaluator.close()
+        sched.report()
+
 """
 Method for handling int type test data 
 """
@@ -79,14 +244,7 @@ def int_test(data: dict, obj_func: callable):
     upper_bound = constant.Constant.INT_UPPER_BOUND
 
     # use multi objectve cma_es
-    for dim, seeds in data.items():
-        if isinstance(seeds, list):
-            if all(isinstance(seed, bytes) for seed in seeds):
-                seeds = mo_cma.convert_seeds_int_step(dim, seeds)
-        # type check
-        assert isinstance(seeds, np.ndarray), "seeds should be a NumPy array"
-        runner = mo_cma.MO_CMA_ES(dim, seeds, obj_func, (lower_bound, upper_bound))
-        runner.run()
+    run_campaign('int', data, obj_func, (lower_bound, upper_bound), mo_cma.convert_seeds_int_step)
 
 """
 Method for handling char type test data 
@@ -95,14 +253,7 @@ def char_test(data: dict, obj_func: callable):
     lower_bound = constant.Constant.CHAR_LOWER_BOUND
     upper_bound = constant.Constant.CHAR_UPPER_BOUND
 
-    for dim, seeds in data.items():
-        if isinstance(seeds, list):
-            if all(isinstance(seed, bytes) for seed in seeds):
-                seeds = mo_cma.convert_seeds_unicode_step(dim, seeds)
-        # type check
-        assert isinstance(seeds, np.ndarray), "seeds should be a NumPy array"
-        runner = mo_cma.MO_CMA_ES(dim, seeds, obj_func, (lower_bound, upper_bound))
-        runner.run()
+    run_campaign('char', data, obj_func, (lower_bound, upper_bound), mo_cma.convert_seeds_unicode_step)
 
 """
 Method for handling pure byte data
@@ -111,12 +262,8 @@ def byte_test(data: dict, obj_func: callable):
     lower_bound = constant.Constant.BYTES_LOWER_BOUND
     upper_bound = constant.Constant.BYTES_UPPER_BOUND
 
-    for dim, seeds in data.items():
-        # type check
-        assert isinstance(seeds, np.ndarray), "seeds should be a NumPy array"
-        # runner = ce.CMA_ES(dim, seeds, obj_func, (lower_bound, upper_bound))
-        runner = mo_cma.MO_CMA_ES(dim, seeds, obj_func, (lower_bound, upper_bound))
-        runner.run()
+    # runner = ce.CMA_ES(dim, seeds, obj_func, (lower_bound, upper_bound))
+    run_campaign('byte', data, obj_func, (lower_bound, upper_bound))
 
 
 """
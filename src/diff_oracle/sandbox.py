@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import multiprocessing.util as mp_util
+import src.utils.config as config
+
+TMPFS_BASE = '/dev/shm'
+
+class SandboxPool:
+    """
+    Pool of pre-created working directories handed out to handlers.
+    Executions run with cwd= set to a sandbox instead of chdir'ing the whole process,
+    a sandbox is only wiped when the target left files behind.
+    """
+    def __init__(self, size: int = 4, tmpfs: bool = False):
+        base = TMPFS_BASE if tmpfs and os.path.isdir(TMPFS_BASE) else None
+        self._root = tempfile.mkdtemp(prefix='c2rust_sandbox_{}_'.format(os.getpid()), dir=base)
+        self._free = []
+        self._count = 0
+        for _ in range(size):
+            self._free.append(self._new_dir())
+        # runs at interpreter exit and when a pool worker process exits
+        mp_util.Finalize(self, shutil.rmtree, args=(self._root, True), exitpriority=0)
+
+    def _new_dir(self) -> str:
+        path = os.path.join(self._root, str(self._count))
+        self._count += 1
+        os.mkdir(path)
+        return path
+
+    def acquire(self) -> str:
+        if self._free:
+            return self._free.pop()
+        return self._new_dir()
+
+    def release(self, path: str):
+        self.wipe(path)
+        self._free.append(path)
+
+    @staticmethod
+    def wipe(path: str, keep: tuple = ()):
+        with os.scandir(path) as it:
+            entries = [entry for entry in it if entry.name not in keep]
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                try:
+                    os.unlink(entry.path)
+                except FileNotFoundError:
+                    pass
+
+_pool = None
+_pool_pid = None
+
+def get_pool() -> SandboxPool:
+    """
+    sandbox pool of the current process, forked workers build their own
+    """
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        _pool = SandboxPool(tmpfs=config.sandbox_tmpfs)
+        _pool_pid = os.getpid()
+    return _pool
@@ -0,0 +1,87 @@
+import re
+import numpy as np
+import src.utils.result as res
+import src.diff_oracle.basic_compare as compare
+
+# a token is complete once whitespace follows it
+_TOKEN = re.compile(rb'(\S+)\s')
+# output compared beyond the length of the expected output before giving up: max(STREAM_OVERRUN, expected length)
+STREAM_OVERRUN = 4096
+
+class StreamComparator:
+    """
+    Compares the stdout of a running program with the already known output of the other
+    implementation, token by token.
+    feed() reports a divergence only when Base_Checker.compare() is certain to see one:
+    a token differs (numerically when both tokens are numbers) from the expected list or number,
+    or there are more tokens than expected. Once the output exceeds the expected length by the
+    overrun bound without such a token, the comparison gives up and the full run decides.
+    cut is the length of the consumed prefix ending on a whole token, the rest is dropped.
+    """
+    def __init__(self, expected: res.DetectionResult):
+        text = expected.original_value
+        self._expected = text.split()
+        self._int_list = (expected.result_type == res.ResultType.LIST
+                          and all(isinstance(v, (int, np.integer)) for v in expected.parsed_value))
+        if self._int_list:
+            # parse_result turns "1 2 3" into "[1, 2, 3]", tokens are compared by value
+            self._expected = [str(v) for v in np.asarray(expected.parsed_value).tolist()]
+        # other lists parsed by ast.literal_eval do not map to whitespace tokens, e.g. "[1.5, 2]"
+        self._by_token = (
+            self._int_list
+            or (expected.result_type == res.ResultType.LIST and not text.startswith('[')
+                and len(expected.parsed_value) == len(self._expected))
+            or expected.result_type in (res.ResultType.INTEGER, res.ResultType.FLOAT)
+        )
+        self._by_count = self._by_token or expected.result_type == res.ResultType.STRING
+        expected_len = len(text.encode('utf-8'))
+        self._limit = expected_len + max(STREAM_OVERRUN, expected_len)
+        self._tail = b""
+        self._offset = 0
+        self._index = 0
+        self._gave_up = False
+        self.cut = None
+
+    @staticmethod
+    def _token_equal(token: str, expected: str) -> bool:
+        if token == expected:
+            return True
+        is_num1, n1 = compare.Compare.try_parse_number(token)
+        is_num2, n2 = compare.Compare.try_parse_number(expected)
+        return is_num1 and is_num2 and n1 == n2
+
+    def feed(self, chunk: bytes) -> bool:
+        """
+        consume the next chunk of stdout, True once the outputs certainly diverge
+        """
+        if self._gave_up:
+            return False
+        data = self._tail + chunk
+        last_end = 0
+        for m in _TOKEN.finditer(data):
+            last_end = m.end()
+            i = self._index
+            self._index += 1
+            token = m.group(1).decode('utf-8', errors='ignore')
+            if self._int_list:
+                token = token.strip('[],')
+                if not compare.Compare.try_parse_number(token)[0]:
+                    # formatted differently, e.g. "[ 1, 2 ]", only the full comparison can tell
+                    self._by_token = self._by_count = False
+            if i >= len(self._expected):
+                # more than one token is a list, it cannot match a shorter list or a scalar
+                diverged = self._by_count and self._index >= 2
+            else:
+                diverged = self._by_token and not self._token_equal(token, self._expected[i])
+            if diverged:
+                self.cut = self._offset + m.end()
+                return True
+        consumed = self._offset + last_end
+        if self._offset + len(data) > self._limit:
+            # e.g. a long last token or trailing whitespace, not a certain divergence
+            self._gave_up = True
+            self._tail = b""
+            return False
+        self._tail = data[last_end:]
+        self._offset = consumed
+        return False
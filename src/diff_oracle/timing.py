@@ -0,0 +1,107 @@
+import sys
+import time
+import hashlib
+import collections
+import numpy as np
+
+# calibrated timeout = clamp(p99 of the seed runtimes * factor, floor, ceiling)
+TIMEOUT_PERCENTILE = 99
+TIMEOUT_FACTOR = 5.0
+TIMEOUT_FLOOR = 1.0
+# seeds executed per binary during calibration
+CALIBRATION_SAMPLES = 200
+# runtimes kept per handler for the percentiles of the report
+STATS_SAMPLES = 4096
+
+class ExecStats:
+    """
+    Execution time statistics of one handler.
+    """
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.timeouts = 0
+        self.hang_hits = 0
+        self._samples = collections.deque(maxlen=STATS_SAMPLES)
+
+    def record(self, duration: float, timed_out: bool = False):
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        self._samples.append(duration)
+        if timed_out:
+            self.timeouts += 1
+
+    def percentile(self, q: float) -> float:
+        if not self._samples:
+            return 0.0
+        return float(np.percentile(self._samples, q))
+
+    def summary(self, name, timeout: float) -> str:
+        mean = self.total / self.count if self.count else 0.0
+        return ("exec {}: {} runs, mean {:.2f} ms, p50 {:.2f} ms, p99 {:.2f} ms, max {:.2f} ms, "
+                "timeout {:.2f} s, {} timeouts, {} skipped hangs").format(
+            name, self.count, mean * 1e3, self.percentile(50) * 1e3, self.percentile(99) * 1e3,
+            self.max * 1e3, timeout, self.timeouts, self.hang_hits)
+
+class HangCache:
+    """
+    Inputs which already timed out once, they are reported as timeout without running them again.
+    """
+    def __init__(self, max_entries: int = 1 << 16):
+        self.max_entries = max_entries
+        # insertion ordered, the oldest hang is dropped first
+        self._keys = {}
+
+    @staticmethod
+    def key(args_buffer: bytes, stdin_data: bytes = None) -> bytes:
+        h = hashlib.blake2b(args_buffer, digest_size=16)
+        if stdin_data is not None:
+            h.update(b'\0stdin\0')
+            h.update(stdin_data)
+        return h.digest()
+
+    def __contains__(self, key: bytes) -> bool:
+        return key in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, key: bytes):
+        if len(self._keys) >= self.max_entries:
+            del self._keys[next(iter(self._keys))]
+        self._keys[key] = None
+
+def derive_timeout(durations: list, ceiling: float) -> float:
+    """
+    timeout derived from measured runtimes, the ceiling when nothing was measured
+    """
+    if len(durations) == 0:
+        return ceiling
+    timeout = float(np.percentile(durations, TIMEOUT_PERCENTILE)) * TIMEOUT_FACTOR
+    return min(max(timeout, TIMEOUT_FLOOR), ceiling)
+
+def calibrate(checker, inputs: list[bytes], ceiling: float):
+    """
+    run the seeds on both programs and set a timeout per binary
+    :param checker: checker owning c_handler and r_handler
+    :param inputs: seeds as passed to the objective, exec_spec() tells how they reach the programs
+    """
+    inputs = [x for x in inputs if x][:CALIBRATION_SAMPLES]
+    for h in (checker.c_handler, checker.r_handler):
+        h.timeout = ceiling
+        durations = []
+        # warm-up run, pays for starting a forkserver / persistent process
+        for i, x in enumerate(inputs[:1] + inputs):
+            args_buffer, stdin_data = checker.exec_spec(x)
+            start = time.perf_counter()
+            if stdin_data is None:
+                h.execute_program_subprocess_args(args_buffer)
+            else:
+                h.execute_program_subprocess_stdin(stdin_data, args_buffer)
+            if i > 0 and not h.timed_out:
+                durations.append(time.perf_counter() - start)
+        h.timeout = derive_timeout(durations, ceiling)
+        print("calibrated timeout of {}: {:.2f} s from {} seeds".format(
+            h.exec_path.decode('utf-8', errors='replace'), h.timeout, len(durations)), file=sys.stderr)
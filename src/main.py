@@ -23,12 +23,12 @@ def main():
         sys.exit(1)
     # separate by b'\n'
     buffers = content.split(b'\n')
+    c_handler = handler.make_handler(c_executable)
+    r_handler = handler.make_handler(rust_executable)
     for buffer in buffers:
         buffer = buffer.strip()
         if not buffer:
             continue
-        c_handler = handler.Handler(c_executable)
-        r_handler = handler.Handler(rust_executable)
         # execute c
         c_handler.execute_program_subprocess_args(buffer)
         c_result = c_handler.get_result()
@@ -44,8 +44,8 @@ def main():
         diff = Compare.compute_diff(c_result, r_result)
         if diff > constant.Constant.EPSILON:
             Compare.log_divergence(buffer, c_result, r_result, c_error, r_error, diff)
-        c_handler.deinit()
-        r_handler.deinit()
+    c_handler.deinit()
+    r_handler.deinit()
 
 def to_utf_8(file_path):
     with open(file_path, "rb") as f:
@@ -76,13 +76,138 @@ if __name__ == '__main__':
     parser.add_argument('--afl-seed', type=str, help="Path to the AFL seed folder")
     parser.add_argument('--proto', nargs=3, metavar=('proto_path', 'proto_name', 'msg_name'),
                         help="Specify Protocol Buffer details: path to .proto file, Protocol Buffer name, and message name")
+    parser.add_argument('-j', '--workers', type=int, default=1,
+                        help="Number of worker processes used to evaluate each generation")
+    parser.add_argument('--async', dest='async_concurrency', type=int, default=0, metavar='N',
+                        help="Evaluate generations with asyncio, N candidates in flight, C and Rust run concurrently")
+    parser.add_argument('--eval-cache', type=str, metavar='db_path',
+                        help="Persistent evaluation cache shared by runs on the same C/Rust binaries")
+    parser.add_argument('--eval-cache-size', type=int, default=1_000_000,
+                        help="Max entries kept in the evaluation cache, least recently used are evicted")
+    parser.add_argument('--novelty', action='store_true',
+                        help="Use coverage novelty (new and rare edges) as the second objective instead of coverage percentage")
+    parser.add_argument('--persistent', action='store_true',
+                        help="Targets run in persistent mode (persistent.h / persistent.rs), stdin input only")
+    parser.add_argument('--timeout', type=float, metavar='seconds',
+                        help="Fixed execution timeout, by default it is calibrated per binary from the seed runtimes")
+    parser.add_argument('--stream-compare', action='store_true',
+                        help="Compare the Rust output with the C output while it runs, kill it on a certain divergence")
+    parser.add_argument('--output-cap', type=int, default=1 << 20, metavar='bytes',
+                        help="Bytes of stdout/stderr kept per execution, longer outputs are truncated and hashed")
+    parser.add_argument('--divergence-log', type=str, default="divergence.jsonl", metavar='path',
+                        help="Divergence log (JSON lines), print it with python -m src.utils.divergence_log")
+    parser.add_argument('--divergence-log-size', type=int, default=64 << 20, metavar='bytes',
+                        help="Size after which the divergence log is rotated, 0 disables rotation")
+    parser.add_argument('--bucket-keep', type=int, default=3, metavar='N',
+                        help="Divergences logged per bucket of similar divergences, then only smaller inputs; 0 logs all")
+    parser.add_argument('--bucket-coverage', action='store_true',
+                        help="Bucket divergences per C coverage path as well, finer buckets")
+    parser.add_argument('--minimize', type=str, metavar='out_dir',
+                        help="After the campaign, shrink the logged divergent inputs (ddmin) into out_dir")
+    parser.add_argument('--minimize-budget', type=int, default=2000, metavar='N',
+                        help="Max evaluations spent on minimizing one divergent input")
+    parser.add_argument('--islands', type=int, default=1, metavar='K',
+                        help="Run K MO-CMA-ES islands in parallel processes, exchanging their best individuals")
+    parser.add_argument('--migration-interval', type=int, default=10, metavar='gens',
+                        help="Generations between two migrations of the island model")
+    parser.add_argument('--migrants', type=int, default=4,
+                        help="Individuals sent to the next island per migration")
+    parser.add_argument('--steady-state', action='store_true',
+                        help="Protobuf CMA-ES: evaluate asynchronously on the -j workers, tell once popsize results are in")
+    parser.add_argument('--surrogate', action='store_true',
+                        help="Execute only the candidates a kNN surrogate of the evaluation history finds most promising")
+    parser.add_argument('--surrogate-keep', type=float, default=0.3, metavar='fraction',
+                        help="Fraction of each generation executed as most promising by the surrogate")
+    parser.add_argument('--surrogate-explore', type=float, default=0.1, metavar='fraction',
+                        help="Fraction of the other candidates executed anyway, picked at random")
+    parser.add_argument('--dedup', action='store_true',
+                        help="Reuse the values of already evaluated integer vectors and resample instead of executing them")
+    parser.add_argument('--dedup-size', type=int, default=200_000, metavar='N',
+                        help="Integer vectors whose values are kept by --dedup, older ones are only remembered in a Bloom filter")
+    parser.add_argument('--cma-mode', choices=['auto', 'full', 'sep'], default='auto',
+                        help="Covariance model of the CMA strategies, sep (diagonal) is linear in the dimension; auto uses it above --sep-threshold")
+    parser.add_argument('--sep-threshold', type=int, default=200, metavar='dim',
+                        help="Dimension above which --cma-mode auto uses the separable strategies")
+    parser.add_argument('--subspace', type=int, default=0, metavar='k',
+                        help="Search k coordinates of longer inputs at a time, the others stay at the best input found")
+    parser.add_argument('--subspace-period', type=int, default=10, metavar='gens',
+                        help="Generations of MO-CMA-ES between two subspace rotations (CMA-ES rotates per restart)")
+    parser.add_argument('--subspace-policy', choices=['window', 'guided'], default='window',
+                        help="Next subspace: the next window of the input, or sampled by the gains of the coordinates")
+    parser.add_argument('--schedule', action='store_true',
+                        help="Search the dimension groups in slices, giving more generations to the groups that find divergences or coverage")
+    parser.add_argument('--slice-gens', type=int, default=10, metavar='gens',
+                        help="Generations a scheduled group runs before the scheduler picks again")
+    parser.add_argument('--arm-gens', type=int, default=150, metavar='gens',
+                        help="Generations one scheduled group runs at most")
+    parser.add_argument('--parallel-arms', type=int, default=1, metavar='K',
+                        help="Scheduled groups searched at once, each in its own process (implies --schedule)")
+    parser.add_argument('--budget-time', type=float, metavar='seconds',
+                        help="Wall-clock budget of the campaign (implies --schedule)")
+    parser.add_argument('--budget-evals', type=int, metavar='N',
+                        help="Evaluation budget of the campaign (implies --schedule)")
+    parser.add_argument('--checkpoint', type=str, metavar='path',
+                        help="Periodically save the campaign (search state, position, novelty map, dedup index) to path")
+    parser.add_argument('--checkpoint-interval', type=int, default=10, metavar='gens',
+                        help="Generations between two checkpoints of the running search")
+    parser.add_argument('--resume', action='store_true',
+                        help="Continue the campaign saved in the --checkpoint file (campaign.ckpt by default)")
+    parser.add_argument('--tmpfs-sandbox', action='store_true',
+                        help="Create the execution sandbox directories on tmpfs (/dev/shm)")
+    parser.add_argument('--forkserver', nargs='?', const='', metavar='shim_path',
+                        help="Execute through an AFL-style forkserver, optionally preloading the given forkserver shim")
 
     args = parser.parse_args()
+    if args.timeout is not None and args.timeout <= 0:
+        parser.error("--timeout must be positive")
     config.use_gpu = args.gpu
     config.char_type_data = args.char
     config.int_type_data = not args.char and args.int
     config.args_read = args.args
     config.stdin_read = not args.args and args.stdin
+    config.workers = max(1, args.workers)
+    config.async_concurrency = max(0, args.async_concurrency)
+    config.sandbox_tmpfs = args.tmpfs_sandbox
+    config.cov_novelty = args.novelty
+    config.eval_store = args.eval_cache
+    config.eval_store_size = args.eval_cache_size
+    config.persistent = args.persistent
+    config.exec_timeout = args.timeout if args.timeout is not None else 10
+    config.calibrate_timeout = args.timeout is None
+    config.stream_compare = args.stream_compare
+    config.output_cap = max(1, args.output_cap)
+    config.divergence_log = args.divergence_log
+    config.divergence_log_size = max(0, args.divergence_log_size)
+    config.divergence_buckets = max(0, args.bucket_keep)
+    config.bucket_coverage = args.bucket_coverage
+    config.islands = max(1, args.islands)
+    config.migration_interval = max(1, args.migration_interval)
+    config.migrants = max(1, args.migrants)
+    config.steady_state = args.steady_state
+    config.surrogate = args.surrogate
+    config.surrogate_keep = min(1.0, max(0.0, args.surrogate_keep))
+    config.surrogate_explore = min(1.0, max(0.0, args.surrogate_explore))
+    config.dedup = args.dedup
+    config.dedup_size = max(1, args.dedup_size)
+    config.cma_mode = args.cma_mode
+    config.sep_threshold = max(1, args.sep_threshold)
+    config.subspace = max(0, args.subspace)
+    config.subspace_period = max(1, args.subspace_period)
+    config.subspace_policy = args.subspace_policy
+    config.parallel_arms = max(1, args.parallel_arms)
+    config.budget_time = args.budget_time
+    config.budget_evals = args.budget_evals
+    config.schedule = (args.schedule or config.parallel_arms > 1 or args.budget_time is not None
+                       or args.budget_evals is not None)
+    config.schedule_slice = max(1, args.slice_gens)
+    config.schedule_gens = max(1, args.arm_gens)
+    config.checkpoint = args.checkpoint or ("campaign.ckpt" if args.resume else None)
+    config.checkpoint_interval = max(1, args.checkpoint_interval)
+    config.resume = args.resume
+    config.minimize_dir = args.minimize
+    config.minimize_budget = max(1, args.minimize_budget)
+    config.forkserver = args.forkserver is not None
+    config.forkserver_shim = args.forkserver or None
 
     if args.checker:
         if args.afl_seed:
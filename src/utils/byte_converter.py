@@ -11,4 +11,92 @@ def int_numpy_to_bytes(int_array):
     """
     transfer uint8 numpy array to bytes
     """
-    return int_array.astype('uint8').tobytes()
\ No newline at end of file
+    return int_array.astype('uint8').tobytes()
+
+def _rint(xs: np.ndarray) -> np.ndarray:
+    xs = np.asarray(xs)
+    if not np.issubdtype(xs.dtype, np.integer):
+        xs = np.rint(xs)
+    return xs.astype(np.int64)
+
+def _split_rows(blob: bytes, lengths: np.ndarray) -> list[bytes]:
+    """
+    cut a concatenation of rows back into one bytes object per row
+    """
+    ends = np.cumsum(lengths).tolist()
+    starts = [0] + ends[:-1]
+    return [blob[s:e] for s, e in zip(starts, ends)]
+
+def _join_tokens(chars: np.ndarray, valid: np.ndarray) -> list[bytes]:
+    """
+    chars/valid: (n, dim, width), the last valid byte of every token is followed by a space slot
+    concatenate the valid bytes of each row, dropping the space after the last token
+    """
+    n = chars.shape[0]
+    if n == 0:
+        return []
+    if chars.shape[1] == 0:
+        return [b''] * n
+    lengths = valid.reshape(n, -1).sum(axis=1)
+    rows = _split_rows(chars[valid].tobytes(), lengths)
+    return [row[:-1] for row in rows]
+
+def int_rows_to_ascii(xs: np.ndarray) -> list[bytes]:
+    """
+    batch version of b' '.join(str(i).encode() for i in row) for a (n, dim) array
+    """
+    xs = _rint(xs)
+    n, dim = xs.shape
+    # uint64 keeps the magnitude of the int64 minimum
+    mag = np.abs(xs).astype(np.uint64)
+    width = max(1, len(str(int(mag.max())))) if xs.size else 1
+    powers = 10 ** np.arange(width - 1, -1, -1, dtype=np.uint64)
+    digits = (mag[:, :, None] // powers) % 10
+    # a number starts at its first non-zero digit, 0 keeps its last digit
+    n_digits = np.where(mag == 0, 1, width - np.argmax(digits != 0, axis=2))
+    # slot layout per token: sign, width digits, separator
+    chars = np.empty((n, dim, width + 2), dtype=np.uint8)
+    chars[:, :, 0] = ord('-')
+    chars[:, :, 1:-1] = digits.astype(np.uint8) + ord('0')
+    chars[:, :, -1] = ord(' ')
+    valid = np.zeros(chars.shape, dtype=bool)
+    valid[:, :, 0] = xs < 0
+    valid[:, :, 1:-1] = np.arange(width) >= (width - n_digits)[:, :, None]
+    valid[:, :, -1] = True
+    return _join_tokens(chars, valid)
+
+def codepoints_to_utf8(xs: np.ndarray) -> list[bytes]:
+    """
+    batch version of b' '.join(chr(c).encode('utf-8') for c in row) for a (n, dim) array
+    surrogates are encoded like 'surrogatepass' would
+    """
+    cp = _rint(xs)
+    if cp.size and (cp.min() < 0 or cp.max() > 0x10FFFF):
+        raise ValueError("code point out of range")
+    cp = cp.astype(np.uint32)
+    n, dim = cp.shape
+    # slot layout per token: up to 4 utf-8 bytes, separator
+    chars = np.zeros((n, dim, 5), dtype=np.uint8)
+    n_bytes = 1 + (cp >= 0x80) + (cp >= 0x800) + (cp >= 0x10000)
+    one, two, three, four = (n_bytes == 1), (n_bytes == 2), (n_bytes == 3), (n_bytes == 4)
+    cont = lambda shift: (0x80 | ((cp >> shift) & 0x3F)).astype(np.uint8)
+    chars[:, :, 0] = np.select(
+        [one, two, three, four],
+        [cp, 0xC0 | (cp >> 6), 0xE0 | (cp >> 12), 0xF0 | (cp >> 18)]).astype(np.uint8)
+    chars[:, :, 1] = np.select([two, three, four], [cont(0), cont(6), cont(12)], 0)
+    chars[:, :, 2] = np.select([three, four], [cont(0), cont(6)], 0)
+    chars[:, :, 3] = np.where(four, cont(0), 0)
+    chars[:, :, 4] = ord(' ')
+    valid = np.zeros(chars.shape, dtype=bool)
+    valid[:, :, :4] = np.arange(4) < n_bytes[:, :, None]
+    valid[:, :, 4] = True
+    return _join_tokens(chars, valid)
+
+def int_rows_to_bytes(xs: np.ndarray) -> list[bytes]:
+    """
+    batch version of int_numpy_to_bytes, one payload per row
+    """
+    arr = np.ascontiguousarray(np.asarray(xs).astype('uint8'))
+    if arr.shape[1] == 0:
+        return [b''] * arr.shape[0]
+    return _split_rows(arr.tobytes(), np.full(arr.shape[0], arr.shape[1]))
@@ -0,0 +1,66 @@
+import os
+import sys
+import pickle
+import random
+import numpy as np
+import src.utils.config as config
+
+"""
+Campaign checkpoints.
+One pickle file holds the position of the campaign (index of the dimension group or protobuf case
+being searched), the state of the running search (pickled by the engine itself), the campaign-wide
+search data (novelty map, lattice index) and the random generator states.
+Files are replaced atomically, a crash while saving keeps the previous checkpoint.
+"""
+
+class Checkpoint:
+    def __init__(self, path: str, kind: str, groups: list):
+        """
+        :param kind: campaign type, e.g. 'int' or 'proto', a checkpoint of another kind is not resumed
+        :param groups: what the campaign loops over (dimensions, case count), must match to resume
+        """
+        self.path = path
+        self.key = (kind, list(groups))
+
+    def load(self) -> dict:
+        """
+        saved state, empty when there is nothing to resume
+        """
+        if not config.resume or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'rb') as f:
+                state = pickle.load(f)
+        except Exception as e:
+            print("Error: Failed to read checkpoint {}: {}".format(self.path, e), file=sys.stderr)
+            return {}
+        if state.get('key') != self.key:
+            print("checkpoint {} belongs to another campaign, starting over".format(self.path), file=sys.stderr)
+            return {}
+        np.random.set_state(state['np_random'])
+        random.setstate(state['random'])
+        print("resuming from {} at group {}".format(self.path, state['index']), file=sys.stderr)
+        return state
+
+    def save(self, index: int, search: bytes = None, **data):
+        """
+        :param index: position in the campaign loop
+        :param search: state of the search running at index, None once it completed
+        :param data: campaign-wide objects, e.g. virgin_map and lattice
+        """
+        state = dict(data, key=self.key, index=index, search=search,
+                     np_random=np.random.get_state(), random=random.getstate())
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+def open_campaign(kind: str, groups: list) -> Checkpoint:
+    """
+    checkpoint of the campaign when checkpointing is configured, else None
+    """
+    if not config.checkpoint:
+        return None
+    return Checkpoint(config.checkpoint, kind, groups)
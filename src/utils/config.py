@@ -3,4 +3,74 @@ int_type_data = False
 char_type_data = False
 stdin_read = False
 args_read = False
-cov_temp = '/tmp/c2rust_cov.txt'
\ No newline at end of file
+# forkserver execution, shim is the LD_PRELOAD library built from coverage/forkserver.c
+forkserver = False
+forkserver_shim = None
+# number of worker processes evaluating a generation
+workers = 1
+# place the per-handler sandbox directories on tmpfs
+sandbox_tmpfs = False
+# candidates in flight for the asyncio backend, 0 disables it
+async_concurrency = 0
+# persistent evaluation cache (sqlite file) and its max number of entries
+eval_store = None
+eval_store_size = 1_000_000
+# second objective: coverage novelty against a campaign-wide virgin map instead of coverage percentage
+cov_novelty = False
+# long-lived targets built with persistent.h / persistent.rs, inputs framed on stdin
+persistent = False
+# execution timeout in seconds, upper bound of the per-binary timeouts calibrated from the seeds
+exec_timeout = 10
+calibrate_timeout = True
+# compare the Rust stdout with the known C output while it runs, kill it once they certainly diverge
+stream_compare = False
+# bytes captured per output stream, the rest is only hashed
+output_cap = 1 << 20
+# structured divergence log (JSON lines), rotated past divergence_log_size bytes
+divergence_log = "divergence.jsonl"
+divergence_log_size = 64 << 20
+divergence_log_backups = 5
+# divergences logged per bucket (same mismatch signature) before only smaller inputs are, 0 logs all
+divergence_buckets = 3
+# the C coverage hash is part of the bucket signature, one bucket per path and mismatch
+bucket_coverage = False
+# independent MO-CMA-ES islands, each in its own process, 1 runs a single strategy
+islands = 1
+# generations between two migrations and individuals sent per migration
+migration_interval = 10
+migrants = 4
+# steady-state ask/tell for PROTO_CMA_ES, candidates are dispatched to the workers one by one
+steady_state = False
+# surrogate pre-screening: executed fraction of a generation (most promising) and random extra fraction
+surrogate = False
+surrogate_keep = 0.3
+surrogate_explore = 0.1
+# index of evaluated integer vectors, duplicates reuse their value and are replaced by new samples
+dedup = False
+dedup_size = 200_000
+# directory receiving the minimized divergent inputs after the campaign, None skips minimization
+minimize_dir = None
+# evaluations spent on minimizing one input at most
+minimize_budget = 2000
+# bandit scheduling of the dimension groups: generations per slice, generations per group at most,
+# groups searched at once (forked processes), campaign budget in seconds / evaluations (None: unlimited)
+schedule = False
+schedule_slice = 10
+schedule_gens = 150
+parallel_arms = 1
+budget_time = None
+budget_evals = None
+# covariance model of the CMA strategies: 'full', 'sep' (diagonal) or 'auto' (sep above sep_threshold dimensions)
+cma_mode = 'auto'
+sep_threshold = 200
+# random-subspace search: coordinates searched at a time on longer inputs (0 searches all), generations
+# between two rotations of MO_CMA_ES, 'window' (contiguous) or 'guided' (by divergence / coverage gains)
+subspace = 0
+subspace_period = 10
+subspace_policy = 'window'
+# campaign checkpoint file, None disables checkpointing
+checkpoint = None
+# generations between two checkpoints of the running search
+checkpoint_interval = 10
+# continue the campaign from the checkpoint file
+resume = False
@@ -8,6 +8,8 @@ class Constant:
     STR_MISMATCH_DIFF: float = 1.0
     LIST_LENGTH_MISMATCH_DIFF: float = 1.0
     EXIT_CODE_MISMATCH = 2.0
+    # Rust run killed by the streaming comparison, its full output is unknown
+    STREAM_MISMATCH_DIFF: float = 1.0
     STDERR_MISMATCH = 2.0
 
     # Integer types
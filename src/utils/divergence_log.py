@@ -0,0 +1,214 @@
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import argparse
+import threading
+from datetime import datetime
+import src.utils.config as config
+
+"""
+Structured divergence log.
+Records are JSON lines written by a background thread, which batches whatever is queued, flushes
+each batch and fsyncs at most every FSYNC_INTERVAL seconds. The log rotates to <path>.1 .. <path>.N
+once it grows past config.divergence_log_size.
+Byte fields are stored as text decoded with surrogateescape, so the exact bytes come back on reading.
+Render a log in the human format with: python -m src.utils.divergence_log [path]
+"""
+
+FSYNC_INTERVAL = 1.0
+# records waiting for the writer, put() blocks when it falls this far behind
+QUEUE_SIZE = 10000
+# records written per batch at most
+BATCH_SIZE = 512
+TIME_FORMAT = "%a %b %d %H:%M:%S %Y"
+
+def _text(value) -> str:
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='surrogateescape')
+    return value
+
+def _bytes(value: str) -> bytes:
+    return value.encode('utf-8', errors='surrogateescape')
+
+class DivergenceLog:
+    def __init__(self, path: str, max_bytes: int, backups: int):
+        """
+        :param max_bytes: size after which the log rotates, 0 disables rotation
+        :param backups: rotated files kept
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._queue = queue.Queue(QUEUE_SIZE)
+        self._file = None
+        self._last_sync = 0.0
+        # records written by this process, reported by close()
+        self.records = 0
+        self._thread = threading.Thread(target=self._run, name="divergence-log", daemon=True)
+        self._thread.start()
+
+    def write(self, input_data, out1, out2, err1, err2, diff, bucket: int = None):
+        record = {
+            "time": time.time(),
+            "input": _text(input_data),
+            "c_stdout": _text(out1),
+            "c_stderr": _text(err1),
+            "rust_stdout": _text(out2),
+            "rust_stderr": _text(err2),
+            "diff": diff,
+        }
+        if bucket is not None:
+            record["bucket"] = "{:016x}".format(bucket)
+        self._queue.put(record)
+        self.records += 1
+
+    def close(self):
+        """
+        write out the queued records and stop the writer
+        """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+            if self.records:
+                print("divergence log: {} divergence cases logged to {}".format(self.records, self.path),
+                      file=sys.stderr)
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch = [self._queue.get()]
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                stop = True
+                batch = [r for r in batch if r is not None]
+            try:
+                self._write(batch, force_sync=stop)
+            except Exception as e:
+                print("Error: Failed to write {}: {}".format(self.path, e), file=sys.stderr)
+        if self._file is not None:
+            self._file.close()
+
+    def _write(self, batch: list, force_sync: bool = False):
+        if batch:
+            f = self._open()
+            data = "".join(json.dumps(r) + "\n" for r in batch).encode('ascii')
+            # one write per batch, so processes sharing the log don't interleave records
+            os.write(f.fileno(), data)
+        if self._file is None:
+            return
+        now = time.monotonic()
+        if force_sync or now - self._last_sync >= FSYNC_INTERVAL:
+            os.fsync(self._file.fileno())
+            self._last_sync = now
+        if self.max_bytes and os.fstat(self._file.fileno()).st_size >= self.max_bytes:
+            self._rotate()
+
+    def _open(self):
+        if self._file is not None:
+            try:
+                same = os.stat(self.path).st_ino == os.fstat(self._file.fileno()).st_ino
+            except FileNotFoundError:
+                same = False
+            if same:
+                return self._file
+            # rotated by another process
+            self._file.close()
+        self._file = open(self.path, "ab", buffering=0)
+        return self._file
+
+    def _rotate(self):
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+        if self.backups <= 0:
+            os.unlink(self.path)
+            return
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists("{}.{}".format(self.path, i)):
+                os.replace("{}.{}".format(self.path, i), "{}.{}".format(self.path, i + 1))
+        os.replace(self.path, self.path + ".1")
+
+# start of this run, the records logged before belong to earlier campaigns
+run_start = time.time()
+
+# writer of the current process, forked workers start their own
+_log = None
+_log_pid = None
+_lock = threading.Lock()
+
+def get_log() -> DivergenceLog:
+    global _log, _log_pid
+    with _lock:
+        if _log is None or _log_pid != os.getpid():
+            _log = DivergenceLog(config.divergence_log, config.divergence_log_size, config.divergence_log_backups)
+            _log_pid = os.getpid()
+            atexit.register(_log.close)
+        return _log
+
+def close():
+    """
+    flush the writer of the current process, if it has one, the next record starts a new one
+    """
+    global _log
+    with _lock:
+        if _log is not None and _log_pid == os.getpid():
+            _log.close()
+            _log = None
+
+def read_records(path: str):
+    """
+    records of a log, oldest first, a torn last line is skipped
+    """
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+def record_input(record: dict) -> bytes:
+    return _bytes(record["input"])
+
+def render(record: dict) -> bytes:
+    """
+    human readable form of a record
+    """
+    current_time = datetime.fromtimestamp(record["time"]).strftime(TIME_FORMAT)
+    return (b"======= DIVERGENCE DETECTED =======\n"
+            + b"[Input Data]: \n" + _bytes(record["input"])
+            + b"\n\n[C Program Stdout]:\n" + _bytes(record["c_stdout"])
+            + b"\n\n[C Program Stderr]:\n" + _bytes(record["c_stderr"])
+            + b"\n\n[Rust Program Stdout]:\n" + _bytes(record["rust_stdout"])
+            + b"\n\n[Rust Program Stderr]:\n" + _bytes(record["rust_stderr"])
+            + b"\nDifference Score: " + str(record["diff"]).encode('utf-8') + b"\n\n"
+            + (b"[Bucket]: " + record["bucket"].encode('ascii') + b"\n" if "bucket" in record else b"")
+            + b"\n[Time Detected]: " + current_time.encode('utf-8') + b"\n")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Print a divergence log in the human readable format")
+    parser.add_argument('path', nargs='?', default=config.divergence_log)
+    parser.add_argument('--rotated', action='store_true', help="Include the rotated files, oldest first")
+    args = parser.parse_args()
+    paths = [args.path]
+    if args.rotated:
+        i = 1
+        while os.path.exists("{}.{}".format(args.path, i)):
+            paths.insert(0, "{}.{}".format(args.path, i))
+            i += 1
+        # nothing was written since the last rotation
+        paths = [p for p in paths if os.path.exists(p)]
+    out = sys.stdout.buffer
+    try:
+        for p in paths:
+            for r in read_records(p):
+                out.write(render(r))
+        out.flush()
+    except BrokenPipeError:
+        pass
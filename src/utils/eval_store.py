@@ -0,0 +1,125 @@
+import sys
+import time
+import shlex
+import shutil
+import sqlite3
+import hashlib
+import multiprocessing.util as mp_util
+import src.utils.result as res
+
+def binary_digest(exec_path: str) -> str:
+    """
+    sha256 of the executable behind a command line
+    """
+    argv = shlex.split(exec_path)
+    path = shutil.which(argv[0]) or argv[0]
+    with open(path, 'rb') as f:
+        digest = hashlib.file_digest(f, 'sha256')
+    # extra arguments change the behaviour as well
+    digest.update(' '.join(argv[1:]).encode('utf-8'))
+    return digest.hexdigest()
+
+class EvalStore:
+    """
+    Persistent evaluation cache shared across runs and processes (SQLite, WAL mode).
+    Entries are keyed by (sha256 of C binary, sha256 of Rust binary, input hash) and hold the
+    objective value, coverage and the parsed results of both programs.
+    Least recently used entries are evicted once the store grows past max_entries.
+    """
+    _EVICT_CHECK_EVERY = 1024
+
+    def __init__(self, path: str, c_program: str, r_program: str, max_entries: int = 1_000_000, variant: str = ''):
+        """
+        :param variant: separates entries whose stored values differ in shape, e.g. the coverage objective
+        """
+        self.path = path
+        self.pair = binary_digest(c_program) + binary_digest(r_program) + variant
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._puts = 0
+
+    def __getstate__(self):
+        # sqlite connections can't cross processes, reconnect lazily
+        state = self.__dict__.copy()
+        state['_conn'] = None
+        return state
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            # autocommit: with WAL and synchronous=NORMAL a commit is cheap, and no transaction
+            # stays open across evaluations to block the other workers
+            self._conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS evals ("
+                " pair TEXT NOT NULL, input_hash BLOB NOT NULL,"
+                " diff REAL, cov REAL,"
+                " c_type TEXT, c_value TEXT, c_stderr TEXT, c_exit INTEGER,"
+                " r_type TEXT, r_value TEXT, r_stderr TEXT, r_exit INTEGER,"
+                " last_used INTEGER,"
+                " PRIMARY KEY (pair, input_hash)) WITHOUT ROWID")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS evals_lru ON evals (last_used)")
+            # close the connection when this process (main or pool worker) exits
+            mp_util.Finalize(None, self.close, exitpriority=10)
+        return self._conn
+
+    @staticmethod
+    def _key(x: bytes) -> bytes:
+        return hashlib.blake2b(x, digest_size=16).digest()
+
+    def get(self, x: bytes):
+        """
+        return the stored (diff, cov) for input x, or None
+        """
+        db = self._db()
+        key = self._key(x)
+        row = db.execute("SELECT diff, cov FROM evals WHERE pair = ? AND input_hash = ?",
+                         (self.pair, key)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        db.execute("UPDATE evals SET last_used = ? WHERE pair = ? AND input_hash = ?",
+                   (time.time_ns(), self.pair, key))
+        return row[0], row[1]
+
+    def put(self, x: bytes, value: tuple, c_ret: res.DetectionResult = None, r_ret: res.DetectionResult = None):
+        diff, cov = value
+        row = [self.pair, self._key(x), diff, cov]
+        for ret in (c_ret, r_ret):
+            if ret is None:
+                row += [None, None, None, None]
+            else:
+                row += [ret.result_type.name, ret.original_value, ret.stderr, ret.exit_code]
+        row.append(time.time_ns())
+        self._db().execute("INSERT OR REPLACE INTO evals VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+        self._puts += 1
+        if self._puts % self._EVICT_CHECK_EVERY == 0:
+            self._evict()
+
+    def _evict(self):
+        db = self._db()
+        count = db.execute("SELECT COUNT(*) FROM evals").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        # drop the least recently used entries plus some headroom
+        excess = count - self.max_entries + self.max_entries // 10
+        db.execute("DELETE FROM evals WHERE (pair, input_hash) IN "
+                   "(SELECT pair, input_hash FROM evals ORDER BY last_used LIMIT ?)", (excess,))
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        rate = 100.0 * self.hits / total if total else 0.0
+        return "eval cache {}: {} hits, {} misses ({:.1f}% hit rate)".format(self.path, self.hits, self.misses, rate)
+
+    def report(self):
+        if self.hits or self.misses:
+            print(self.stats(), file=sys.stderr)
@@ -1,6 +1,8 @@
+import re
+import ast
 from dataclasses import dataclass
+import numpy as np
 from src.utils.type import ResultType
-import ast
 @dataclass
 class DetectionResult:
     result_type: ResultType
@@ -9,21 +11,65 @@ class DetectionResult:
     exit_code: int
     parsed_value: object = None
     cov: float = -1.0
+    # packed edge hit map of the C run, only kept for the coverage-novelty objective
+    cov_map: bytes = None
+    # digest of the whole stdout when it exceeded the capture cap, None when original_value is complete
+    digest: bytes = None
+    # hash of the edges hit by the C run, used to bucket divergences
+    cov_hash: bytes = None
+    # killed by the streaming comparison after a certain divergence, original_value is the prefix read
+    aborted: bool = False
+
+# whitespace separated integers which fit in int64, parsed by numpy in one pass
+_INT64_LIST = re.compile(r'-?\d{1,18}(?:\s+-?\d{1,18})+', re.ASCII)
+# integers of any size, digits as accepted by str.isdigit()
+_INT_TOKEN = re.compile(r'-*\d+')
+
+# 1, 10, ..., 10**18: the number of powers <= |v| is the digit count of v
+_POW10 = 10 ** np.arange(19, dtype=np.int64)
+
+def _int_list_text(values: list) -> str:
+    # parse_result always reported integer lists in python list syntax, e.g. "[1, 2, 3]"
+    return '[' + ', '.join(map(str, values)) + ']'
+
+def _int64_list_text(values: np.ndarray, tokens: list[str]) -> str:
+    # the tokens are already the canonical text unless one has leading zeros or is -0,
+    # both make the token longer than str(value)
+    canonical_len = (np.maximum(1, np.searchsorted(_POW10, np.abs(values), side='right')).sum()
+                     + np.count_nonzero(values < 0))
+    if canonical_len == sum(map(len, tokens)):
+        return '[' + ', '.join(tokens) + ']'
+    return _int_list_text(values.tolist())
 
 def parse_result(result_str: str, cov: float = -1.0) -> DetectionResult:
-    # parse as list, dict, tuple
+    """
+    classify and parse the (stripped) output of a program
+    - several integers: LIST, parsed_value is an int64 numpy array (a list of ints beyond int64)
+    - a python list literal, e.g. "[1.5, 'a']": LIST of the evaluated elements
+    - several other tokens: LIST of the tokens
+    - one token: INTEGER, FLOAT or STRING
+    """
+    if _INT64_LIST.fullmatch(result_str):
+        values = np.fromstring(result_str, dtype=np.int64, sep=' ')
+        return DetectionResult(ResultType.LIST, _int64_list_text(values, result_str.split()), "", 0, values, cov)
     parts = result_str.split()
     if len(parts) > 1:
-        if all(part.lstrip('-').isdigit() for part in parts):
-            result_str = str([int(part) for part in parts])
-        try:
-            parsed_result = ast.literal_eval(result_str)
-            if isinstance(parsed_result, list):
-                return DetectionResult(ResultType.LIST, result_str, "", 0, parsed_result, cov)
-        except (ValueError, SyntaxError):
-            pass
-        if isinstance(parts, list):
-            return DetectionResult(ResultType.LIST, result_str, "", 0, parts, cov)
+        if all(_INT_TOKEN.fullmatch(part) for part in parts):
+            try:
+                values = [int(part) for part in parts]
+                return DetectionResult(ResultType.LIST, _int_list_text(values), "", 0, values, cov)
+            except ValueError:
+                # e.g. "--1", kept as tokens
+                pass
+        # only text starting like this can evaluate to a list
+        elif result_str[0] in '[(':
+            try:
+                parsed_result = ast.literal_eval(result_str)
+                if isinstance(parsed_result, list):
+                    return DetectionResult(ResultType.LIST, result_str, "", 0, parsed_result, cov)
+            except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+                pass
+        return DetectionResult(ResultType.LIST, result_str, "", 0, parts, cov)
     # parse as int
     try:
         if result_str.lstrip('-').isdigit():
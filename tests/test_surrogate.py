@@ -0,0 +1,28 @@
+import numpy as np
+import src.algo.surrogate as surrogate
+
+
+class _Inner:
+    def __init__(self):
+        self.calls = []
+
+    def evaluate(self, xs):
+        self.calls.append(xs.shape)
+        return [(-float(x.sum() % 3), float(x[0] % 100)) for x in xs]
+
+    def close(self):
+        pass
+
+
+def test_one_evaluator_over_two_dimensions():
+    inner = _Inner()
+    evaluator = surrogate.ScreeningEvaluator(inner, keep=0.25, explore=0.1)
+    for dim in (3, 5, 3, 5):
+        for _ in range(3):
+            xs = np.random.uniform(0, 255, (40, dim))
+            values = evaluator.evaluate(xs)
+            assert len(values) == len(xs)
+    assert sorted(evaluator._surrogates) == [3, 5]
+    # both surrogates were ready and screened, every inner batch kept its dimension
+    assert evaluator.saved > 0
+    assert {shape[1] for shape in inner.calls} == {3, 5}